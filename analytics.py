@@ -0,0 +1,248 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Relative database paths are resolved here, so the desktop app and the server share one store
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    session TEXT,
+    event TEXT NOT NULL,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    key TEXT NOT NULL,
+    frames INTEGER NOT NULL DEFAULT 0,
+    doomscroll_frames INTEGER NOT NULL DEFAULT 0,
+    doomscroll_seconds REAL NOT NULL DEFAULT 0,
+    episodes INTEGER NOT NULL DEFAULT 0,
+    first_ts REAL,
+    last_ts REAL,
+    PRIMARY KEY (period, key)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO rollups (period, key, frames, doomscroll_frames, doomscroll_seconds, episodes, first_ts, last_ts)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (period, key) DO UPDATE SET
+    frames = frames + excluded.frames,
+    doomscroll_frames = doomscroll_frames + excluded.doomscroll_frames,
+    doomscroll_seconds = doomscroll_seconds + excluded.doomscroll_seconds,
+    episodes = episodes + excluded.episodes,
+    first_ts = min(first_ts, excluded.first_ts),
+    last_ts = max(last_ts, excluded.last_ts)
+"""
+
+ROLLUP_FIELDS = ("frames", "doomscroll_frames", "doomscroll_seconds", "episodes", "first_ts", "last_ts")
+
+
+def hour_key(ts):
+    return time.strftime("%Y-%m-%dT%H", time.gmtime(ts))
+
+
+def day_key(ts):
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+class _SessionState:
+    """Writer-side view of one session: when it was last seen and its open doomscroll episode"""
+
+    __slots__ = ("source", "last_ts", "doomscrolling", "episode_start")
+
+    def __init__(self, source, ts):
+        self.source = source
+        self.last_ts = ts
+        self.doomscrolling = False
+        self.episode_start = None
+
+
+class AnalyticsStore:
+    """Persistent detection history in SQLite (WAL), written in batches off the hot path
+
+    `record()` only puts a tuple on a queue; a writer thread drains it every
+    `flush_interval` seconds (or `batch_size` events) and commits each batch
+    in one transaction. Every detection folds into running totals kept per
+    session, per UTC hour, per UTC day and overall (the `rollups` table), so
+    `stats()` reads a handful of rows by primary key however much history
+    there is. Raw `events` are doomscroll episode starts and ends, not frames.
+
+    Doomscroll seconds are the time between a session's consecutive frames
+    while it is doomscrolling; gaps longer than `max_gap_seconds` (camera
+    off, tab closed) end the episode instead of counting.
+    """
+
+    def __init__(self, path, enabled=True, flush_interval=1.0, batch_size=500, max_gap_seconds=10.0):
+        self.path = path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_gap_seconds = max_gap_seconds
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._sessions = {}
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get('analytics', {})
+        return cls(
+            settings.get('path', 'doomscroll_stats.db'),
+            enabled=settings.get('enabled', True),
+            flush_interval=settings.get('flush_interval_seconds', 1.0),
+            batch_size=settings.get('batch_size', 500),
+            max_gap_seconds=settings.get('max_gap_seconds', 10.0),
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """Create the schema and start the writer thread (in the process that will record)"""
+        if not self.enabled or self._thread is not None:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executescript(SCHEMA)
+            conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Analytics disabled, could not open {self.path}: {e}")
+            self.enabled = False
+            return
+        self._thread = threading.Thread(target=self._write_loop, name="analytics-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Recording detection history to {self.path}")
+
+    def stop(self):
+        """Write everything recorded so far, close open episodes and stop the writer"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def record(self, source, session, doomscrolling, ts=None):
+        """Queue one detection; `session` may be None (counted in the hour/day/total rollups only)"""
+        if self._thread is not None:
+            self._queue.put((time.time() if ts is None else ts, source, session, bool(doomscrolling)))
+
+    def _write_loop(self):
+        conn = self._connect()
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            try:
+                self._flush(conn, batch, closing=not running)
+            except sqlite3.Error as e:
+                logger.error(f"Dropped {len(batch)} analytics events: {e}")
+        conn.close()
+
+    def _flush(self, conn, batch, closing=False):
+        """Fold a batch into rollup deltas and episode events, then write them in one transaction"""
+        deltas = defaultdict(lambda: [0, 0, 0.0, 0, float("inf"), float("-inf")])
+        events = []
+        hour = day = None
+        hour_start = None
+
+        for ts, source, session, doomscrolling in batch:
+            if hour_start != int(ts // 3600):
+                hour_start = int(ts // 3600)
+                hour, day = hour_key(ts), day_key(ts)
+            keys = [("total", ""), ("day", day), ("hour", hour)]
+            seconds, started = 0.0, 0
+
+            if session is not None:
+                keys.append(("session", session))
+                state = self._sessions.get(session)
+                if state is None:
+                    state = self._sessions[session] = _SessionState(source, ts)
+                gap = ts - state.last_ts
+                if state.doomscrolling and gap > self.max_gap_seconds:
+                    # Went quiet mid-episode: close it where it was last seen
+                    events.append((state.last_ts, source, session, "end", state.last_ts - state.episode_start))
+                    state.doomscrolling = False
+                if state.doomscrolling:
+                    seconds = max(0.0, gap)
+                if doomscrolling and not state.doomscrolling:
+                    started = 1
+                    state.episode_start = ts
+                    events.append((ts, source, session, "start", None))
+                elif state.doomscrolling and not doomscrolling:
+                    events.append((ts, source, session, "end", ts - state.episode_start))
+                state.doomscrolling = doomscrolling
+                state.last_ts = max(state.last_ts, ts)
+
+            for key in keys:
+                delta = deltas[key]
+                delta[0] += 1
+                delta[1] += doomscrolling
+                delta[2] += seconds
+                delta[3] += started
+                delta[4] = min(delta[4], ts)
+                delta[5] = max(delta[5], ts)
+
+        # Sessions not seen for a while are finished; closing also finishes the rest
+        now = time.time()
+        for session, state in list(self._sessions.items()):
+            if closing or now - state.last_ts > self.max_gap_seconds:
+                if state.doomscrolling:
+                    events.append((state.last_ts, state.source, session, "end", state.last_ts - state.episode_start))
+                del self._sessions[session]
+
+        if not deltas and not events:
+            return
+        with conn:
+            conn.executemany("INSERT INTO events (ts, source, session, event, seconds) VALUES (?, ?, ?, ?, ?)",
+                             events)
+            conn.executemany(UPSERT_ROLLUP, [key + tuple(delta) for key, delta in deltas.items()])
+
+    def stats(self, session=None, hours=24, days=30):
+        """Rollups for the whole history, one session, and the last `hours` hours / `days` days
+
+        Hours and days without any detections are left out.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            def row(period, key):
+                values = conn.execute(f"SELECT {', '.join(ROLLUP_FIELDS)} FROM rollups WHERE period = ? AND key = ?",
+                                      (period, key)).fetchone()
+                return dict(zip(ROLLUP_FIELDS, values)) if values else None
+
+            def since(period, first_key):
+                rows = conn.execute(f"SELECT key, {', '.join(ROLLUP_FIELDS)} FROM rollups "
+                                    f"WHERE period = ? AND key >= ? ORDER BY key", (period, first_key))
+                return [{period: values[0], **dict(zip(ROLLUP_FIELDS, values[1:]))} for values in rows]
+
+            result = {
+                "total": row("total", ""),
+                "session": row("session", session) if session else None,
+                "hours": since("hour", hour_key(now - (hours - 1) * 3600)) if hours > 0 else [],
+                "days": since("day", day_key(now - (days - 1) * 86400)) if days > 0 else [],
+            }
+        conn.close()
+        return result
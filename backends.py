@@ -0,0 +1,237 @@
+import glob
+import logging
+import os
+import time
+from functools import partial
+
+import cv2
+import numpy as np
+
+from detection import analyze_dlib, analyze_haar, load_thresholds
+
+logger = logging.getLogger(__name__)
+
+# Sample clips are looked up relative to the repository root, wherever the app runs from
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Download from: http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
+PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+
+# Tried in this order when `backends.backend` is "auto" and calibration is off
+DEFAULT_ORDER = ("dlib", "haar")
+
+# detectMultiScale (scale_factor, min_neighbors) sets for the face cascade; the first is the default
+DEFAULT_HAAR_PARAMS = (
+    {"scale_factor": 1.3, "min_neighbors": 5},
+    {"scale_factor": 1.2, "min_neighbors": 5},
+    {"scale_factor": 1.1, "min_neighbors": 5},
+)
+
+
+class DlibBackend:
+    """dlib HOG face detector plus the 68-point landmark predictor"""
+
+    kind = "dlib"
+
+    def __init__(self, name="dlib", predictor_path=PREDICTOR_PATH, predictor=None):
+        self.name = name
+        self.predictor_path = predictor_path
+        self.predictor = predictor
+        self.face_detector = None
+
+    @property
+    def label(self):
+        return self.name
+
+    def load(self):
+        """Load the models; raises ImportError or RuntimeError when dlib or the predictor is missing"""
+        import dlib
+        self.face_detector = dlib.get_frontal_face_detector()
+        if self.predictor is None:
+            self.predictor = dlib.shape_predictor(self.predictor_path)
+        return self
+
+    def for_thread(self):
+        """A copy for another detection thread; the predictor is only read, so it is shared"""
+        return DlibBackend(self.name, self.predictor_path, self.predictor).load()
+
+    def analyze(self, gray, thresholds, scale=1.0, tracker=None, timings=None, origin=(0, 0), frame_height=None):
+        # Landmark scores don't depend on the face position, so there is no frame_height to pass
+        return analyze_dlib(gray, self.face_detector, self.predictor, thresholds, scale,
+                            timings=timings, origin=origin)
+
+
+class HaarBackend:
+    """An OpenCV face cascade plus the eye cascade, with their detectMultiScale parameters"""
+
+    kind = "haar"
+
+    def __init__(self, name, face_file="haarcascade_frontalface_default.xml", scale_factor=1.3, min_neighbors=5,
+                 eye_file="haarcascade_eye.xml", eye_scale_factor=1.1, eye_min_neighbors=5):
+        self.name = name
+        self.face_file = face_file
+        self.face_params = (scale_factor, min_neighbors)
+        self.eye_file = eye_file
+        self.eye_params = (eye_scale_factor, eye_min_neighbors)
+        self.face_cascade = self.eye_cascade = None
+
+    @property
+    def label(self):
+        return f"{self.name} ({self.face_params[0]}, {self.face_params[1]})"
+
+    def load(self):
+        """Build the cascades; raises RuntimeError if a cascade file is missing or invalid"""
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + self.face_file)
+        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + self.eye_file)
+        if self.face_cascade.empty() or self.eye_cascade.empty():
+            raise RuntimeError(f"Could not load {self.face_file} / {self.eye_file}")
+        return self
+
+    def for_thread(self):
+        """A copy for another detection thread (cascades must not be shared between concurrent calls)"""
+        return HaarBackend(self.name, self.face_file, *self.face_params, self.eye_file, *self.eye_params).load()
+
+    def analyze(self, gray, thresholds, scale=1.0, tracker=None, timings=None, origin=(0, 0), frame_height=None):
+        return analyze_haar(gray, self.face_cascade, self.eye_cascade, thresholds, scale, tracker, timings,
+                            origin, frame_height, self.face_params, self.eye_params)
+
+
+# Backend name -> factory(**params) returning an unloaded backend
+BACKENDS = {}
+
+
+def register_backend(name, factory):
+    """Make a backend selectable by name in `backends.backend` and a calibration candidate"""
+    BACKENDS[name] = factory
+
+
+register_backend("dlib", DlibBackend)
+register_backend("haar", partial(HaarBackend, "haar"))
+# Every other frontal face cascade OpenCV ships, e.g. "haar:frontalface_alt2"; all share the eye cascade
+for _path in sorted(glob.glob(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_*.xml"))):
+    _face_file = os.path.basename(_path)
+    if _face_file != "haarcascade_frontalface_default.xml":
+        _name = "haar:" + _face_file[len("haarcascade_"):-len(".xml")]
+        register_backend(_name, partial(HaarBackend, _name, _face_file))
+
+
+def build_backends(name, settings):
+    """Unloaded backends for one registry entry: one per Haar parameter set, a single one for dlib"""
+    if name == "dlib":
+        return [BACKENDS[name](predictor_path=settings.get('dlib_predictor', PREDICTOR_PATH))]
+    param_sets = settings.get('haar_params') or DEFAULT_HAAR_PARAMS
+    return [BACKENDS[name](**params) for params in param_sets]
+
+
+def load_candidates(names, settings, first_only=False):
+    """Every loadable backend/parameter set for `names` (only the default set with `first_only`)
+
+    Backends that can't be loaded are logged and skipped.
+    """
+    candidates = []
+    for name in names:
+        if name not in BACKENDS:
+            logger.warning(f"Unknown detection backend {name!r} (known: {', '.join(BACKENDS)})")
+            continue
+        backends = build_backends(name, settings)
+        for backend in backends[:1] if first_only else backends:
+            try:
+                candidates.append(backend.load())
+            except (ImportError, RuntimeError) as e:
+                logger.info(f"Backend {backend.label} unavailable: {e}")
+                break
+    return candidates
+
+
+def sample_frames(path, count, width=480):
+    """`count` grayscale frames spread evenly over a video, resized to `width`"""
+    cap = cv2.VideoCapture(path if os.path.isabs(path) else os.path.join(ROOT_DIR, path))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    indices = np.linspace(0, total - 1, count).astype(int) if total > 0 else []
+    for index in indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ok, frame = cap.read()
+        if not ok:
+            continue
+        if width and frame.shape[1] != width:
+            frame = cv2.resize(frame, (width, round(frame.shape[0] * width / frame.shape[1])),
+                               interpolation=cv2.INTER_AREA)
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    return frames
+
+
+def measure(backend, frames, thresholds, scale=1.0):
+    """Full-search latency and face hit rate of one backend over the sample frames"""
+    backend.analyze(frames[0], thresholds, scale)  # first call pays one-off allocations
+    latencies, hits = [], 0
+    for gray in frames:
+        start = time.perf_counter()
+        analysis = backend.analyze(gray, thresholds, scale)
+        latencies.append(time.perf_counter() - start)
+        hits += len(analysis["faces"]) > 0
+    return {
+        "backend": backend.label,
+        "mean_ms": float(np.mean(latencies) * 1e3),
+        "p95_ms": float(np.percentile(latencies, 95) * 1e3),
+        "face_rate": hits / len(frames),
+    }
+
+
+def calibrate(candidates, frames, thresholds, scale=1.0, budget_ms=40.0, min_face_rate=0.6):
+    """Time every candidate on the sample frames; returns (chosen backend, per-candidate results)
+
+    A candidate qualifies if it finds a face in at least `min_face_rate` of
+    the frames the best candidate does. The fastest qualifying candidate
+    whose p95 latency fits `budget_ms` wins; if none fits, the fastest
+    qualifying one is used anyway.
+    """
+    results = [measure(backend, frames, thresholds, scale) for backend in candidates]
+    best_rate = max(result["face_rate"] for result in results)
+    qualifying = [i for i, result in enumerate(results) if result["face_rate"] >= min_face_rate * best_rate]
+    within_budget = [i for i in qualifying if results[i]["p95_ms"] <= budget_ms]
+    if not within_budget:
+        logger.warning(f"No detection backend meets the {budget_ms:.0f} ms budget, using the fastest")
+    chosen = min(within_budget or qualifying, key=lambda i: results[i]["p95_ms"])
+    for i, result in enumerate(results):
+        result["selected"] = i == chosen
+    return candidates[chosen], results
+
+
+def select_backend(config):
+    """The detection backend to use, per the `backends` config section; returns (backend, calibration)
+
+    `backend` names a registry entry or "auto" (dlib, falling back to Haar).
+    With `calibrate` on, every candidate (all registered backends for "auto")
+    is timed on `sample_clip` and the fastest within `latency_budget_ms`
+    wins; `calibration` then holds the per-candidate results, otherwise None.
+    """
+    settings = config.get('backends', {})
+    choice = settings.get('backend', 'auto')
+
+    if settings.get('calibrate', False):
+        start = time.perf_counter()
+        candidates = load_candidates(list(BACKENDS) if choice == 'auto' else [choice], settings)
+        frames = sample_frames(settings.get('sample_clip', 'rickroll.mp4'),
+                               settings.get('sample_frames', 15), settings.get('sample_width', 480))
+        if candidates and frames:
+            backend, results = calibrate(candidates, frames, load_thresholds(config),
+                                         config.get('detection', {}).get('scale', 1.0),
+                                         settings.get('latency_budget_ms', 40.0), settings.get('min_face_rate', 0.6))
+            for result in results:
+                logger.info(f"Calibration: {result['backend']}: p95 {result['p95_ms']:.1f} ms, "
+                            f"mean {result['mean_ms']:.1f} ms, faces in {result['face_rate']:.0%} of frames"
+                            f"{' <- selected' if result['selected'] else ''}")
+            logger.info(f"Selected {backend.label} after calibrating {len(candidates)} candidates on "
+                        f"{len(frames)} frames in {time.perf_counter() - start:.1f} s")
+            return backend, results
+        logger.warning("Calibration skipped: no usable backend or sample clip")
+
+    names = DEFAULT_ORDER if choice == 'auto' else [choice]
+    for name in names:
+        candidates = load_candidates([name], settings, first_only=True)
+        if candidates:
+            logger.info(f"Using {candidates[0].label} detection backend")
+            return candidates[0], None
+    raise RuntimeError(f"No detection backend available out of {', '.join(names)}")
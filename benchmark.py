@@ -0,0 +1,447 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from detection import (DEFAULT_THRESHOLDS, FaceTracker, landmarks_to_array, score_haar_faces, score_landmarks,
+                       upscale_boxes)
+from main import DoomscrollDetector
+
+# The web API modules import each other as top-level modules (uvicorn runs from web/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "web"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def load_frames(video_path, width=None, limit=None):
+    """Decode a video into a list of BGR frames, optionally resized to `width`"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {video_path}")
+
+    frames = []
+    while limit is None or len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if width and frame.shape[1] != width:
+            frame = resize_to_width(frame, width)
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_detector(detector, frames):
+    """Run the desktop detector over frames; returns (decisions, face boxes, per-frame seconds)"""
+    detect = detector.detect_doomscroll_dlib if detector.use_dlib else detector.detect_doomscroll_opencv
+    decisions, faces, latencies = [], [], []
+    for frame in frames:
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        decisions.append(detect(gray)[0])
+        latencies.append(time.perf_counter() - start)
+        if not detector.use_dlib:
+            # The tracker keeps its box in downscaled coordinates
+            box = detector.face_tracker.box
+            faces.append(tuple(int(v) for v in upscale_boxes([box], detector.detection_scale)[0]) if box else None)
+    return decisions, faces, latencies
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union else 0.0
+
+
+def sweep_scales(args):
+    """Compare latency and agreement with full-resolution detection for each detection.scale"""
+    frames = load_frames(args.video, args.width, args.limit)
+    detector = DoomscrollDetector(args.config)
+    # Isolate the effect of scaling: full-frame face search on every frame
+    if not detector.use_dlib:
+        detector.face_tracker.full_search_interval = 0
+
+    results = []
+    baseline = None
+    for scale in sorted(args.scales, reverse=True):
+        detector.detection_scale = scale
+        decisions, faces, latencies = run_detector(detector, frames)
+        if baseline is None:
+            baseline = (decisions, faces)
+
+        decision_agreement = np.mean([a == b for a, b in zip(decisions, baseline[0])])
+        presence_agreement = np.mean([(a is None) == (b is None) for a, b in zip(faces, baseline[1])])
+        matched = [box_iou(a, b) for a, b in zip(faces, baseline[1]) if a and b]
+        results.append({
+            "scale": scale,
+            "mean_ms": float(np.mean(latencies) * 1e3),
+            "p95_ms": float(np.percentile(latencies, 95) * 1e3),
+            "decision_agreement": float(decision_agreement),
+            "face_presence_agreement": float(presence_agreement),
+            "mean_face_iou": float(np.mean(matched)) if matched else None,
+        })
+
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]} from {args.video}")
+    print(f"{'scale':>6} {'mean ms':>8} {'p95 ms':>8} {'decision':>9} {'presence':>9} {'face IoU':>9}")
+    for row in results:
+        iou = f"{row['mean_face_iou']:.3f}" if row['mean_face_iou'] is not None else "n/a"
+        print(f"{row['scale']:>6.2f} {row['mean_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['decision_agreement']:>9.1%} {row['face_presence_agreement']:>9.1%} {iou:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"video": args.video, "frames": len(frames), "scales": results}, f, indent=2)
+
+
+class _Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+class _Shape:
+    """Stand-in for dlib.full_object_detection (same part()/parts()/num_parts interface)"""
+
+    def __init__(self, points):
+        self._points = [_Point(int(x), int(y)) for x, y in points]
+        self.num_parts = len(self._points)
+
+    def part(self, i):
+        return self._points[i]
+
+    def parts(self):
+        return self._points
+
+
+def make_shapes(landmarks):
+    """Landmark objects for the microbenchmark: real dlib objects when dlib is installed"""
+    try:
+        import dlib
+    except ImportError:
+        return [_Shape(points) for points in landmarks], "stand-in objects (dlib not installed)"
+
+    rect = dlib.rectangle(0, 0, 640, 480)
+    shapes = [dlib.full_object_detection(rect, [dlib.point(int(x), int(y)) for x, y in points])
+              for points in landmarks]
+    return shapes, "dlib.full_object_detection"
+
+
+def legacy_score_shape(landmarks):
+    """Per-face scoring as the detectors did it before the shared module (reference only)"""
+    nose_tip = (landmarks.part(30).x, landmarks.part(30).y)
+    chin = (landmarks.part(8).x, landmarks.part(8).y)
+    forehead_approx = (landmarks.part(27).x, landmarks.part(27).y)
+
+    left_eye_points = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(36, 42)]
+    right_eye_points = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(42, 48)]
+
+    left_eye_top = (left_eye_points[1][1] + left_eye_points[2][1]) / 2
+    left_eye_bottom = (left_eye_points[4][1] + left_eye_points[5][1]) / 2
+    left_eye_center = (left_eye_points[0][1] + left_eye_points[3][1]) / 2
+
+    right_eye_top = (right_eye_points[1][1] + right_eye_points[2][1]) / 2
+    right_eye_bottom = (right_eye_points[4][1] + right_eye_points[5][1]) / 2
+    right_eye_center = (right_eye_points[0][1] + right_eye_points[3][1]) / 2
+
+    left_ratio = abs(left_eye_center - left_eye_top) / (abs(left_eye_bottom - left_eye_top) + 1e-6)
+    right_ratio = abs(right_eye_center - right_eye_top) / (abs(right_eye_bottom - right_eye_top) + 1e-6)
+    eye_ratio = (left_ratio + right_ratio) / 2
+
+    head_tilt = (chin[1] - nose_tip[1]) / (nose_tip[1] - forehead_approx[1] + 1e-6)
+    return head_tilt > 1.3 or eye_ratio < 0.35
+
+
+def legacy_score_haar(face, eyes, frame_height):
+    """Per-face Haar scoring as the desktop app did it before the shared module (reference only)
+
+    `eyes` are relative to the face box, as the old eye search returned them.
+    """
+    x, y, w, h = face
+    detection_score = 0
+
+    face_position_ratio = (y + h//2) / frame_height
+    if face_position_ratio > 0.58:
+        detection_score += 2
+    elif face_position_ratio > 0.52:
+        detection_score += 1
+
+    if h / w < 1.1:
+        detection_score += 1
+
+    if len(eyes) >= 2:
+        eye_y_positions = [y + ey + eh//2 for (ex, ey, ew, eh) in eyes]
+        eye_position_in_face = (sum(eye_y_positions) / len(eye_y_positions) - y) / h
+        if eye_position_in_face > 0.6:
+            detection_score += 2
+        elif eye_position_in_face > 0.52:
+            detection_score += 1
+    else:
+        detection_score += 1
+
+    return detection_score >= 3
+
+
+def make_haar_boxes(rng, faces, frame_height=480):
+    """Random face boxes with 0-3 eye boxes each, as detectMultiScale and find_eyes return them"""
+    sizes = rng.integers(60, 200, size=(faces, 2))
+    corners = rng.integers(0, frame_height - 200, size=(faces, 2))
+    boxes = np.hstack([corners, sizes]).astype(np.int32)
+    roi_eyes = [rng.integers(0, 60, size=(rng.integers(0, 4), 4)).astype(np.int32) for _ in range(faces)]
+    frame_eyes = [e + np.array([x, y, 0, 0], dtype=np.int32) for e, (x, y, _, _) in zip(roi_eyes, boxes)]
+    return boxes, roi_eyes, frame_eyes
+
+
+def time_per_face(fn, faces, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / faces * 1e6
+
+
+def microbench_scoring(args):
+    """Per-face Python overhead of the scoring: legacy per-face code vs the shared detection core
+
+    Landmarks: both sides include reading the points out of the landmark
+    objects. Haar: both sides start from the boxes the cascades returned.
+    """
+    rng = np.random.default_rng(0)
+    header = f"{'faces':>6} {'legacy us/face':>15} {'current us/face':>16} {'speedup':>8}"
+    print(f"landmarks\n{header}")
+    rows = []
+    for faces in args.faces:
+        landmarks = rng.integers(0, 480, size=(faces, 68, 2))
+        shapes, kind = make_shapes(landmarks)
+
+        legacy = time_per_face(lambda: [legacy_score_shape(s) for s in shapes], faces, args.repeat)
+        current = time_per_face(
+            lambda: score_landmarks(landmarks_to_array(shapes), DEFAULT_THRESHOLDS),
+            faces, args.repeat)
+        rows.append({"faces": faces, "legacy_us_per_face": legacy, "current_us_per_face": current})
+        print(f"{faces:>6} {legacy:>15.2f} {current:>16.2f} {legacy / current:>7.1f}x")
+    print(f"landmarks: {kind}")
+
+    print(f"\nhaar\n{header}")
+    haar_rows = []
+    for faces in args.faces:
+        boxes, roi_eyes, frame_eyes = make_haar_boxes(rng, faces)
+        legacy = time_per_face(
+            lambda: [legacy_score_haar(box, eyes, 480) for box, eyes in zip(boxes, roi_eyes)],
+            faces, args.repeat)
+        current = time_per_face(
+            lambda: score_haar_faces(boxes, frame_eyes, 480, DEFAULT_THRESHOLDS),
+            faces, args.repeat)
+        haar_rows.append({"faces": faces, "legacy_us_per_face": legacy, "current_us_per_face": current})
+        print(f"{faces:>6} {legacy:>15.2f} {current:>16.2f} {legacy / current:>7.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"landmarks": kind, "results": rows, "haar": haar_rows}, f, indent=2)
+
+
+def iter_frames(path, width=None, limit=None):
+    """Yield (bgr_frame, decode_seconds, encoded_bytes) from a video file or a directory of images
+
+    `encoded_bytes` is the image file content for directories and None for
+    videos; resizing is not counted as decode time.
+    """
+    count = 0
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names:
+            if limit is not None and count >= limit:
+                return
+            with open(os.path.join(path, name), "rb") as f:
+                data = f.read()
+            start = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            decode = time.perf_counter() - start
+            if frame is None:
+                continue
+            if width and frame.shape[1] != width:
+                frame = resize_to_width(frame, width)
+                data = None
+            count += 1
+            yield frame, decode, data
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {path}")
+    try:
+        while limit is None or count < limit:
+            start = time.perf_counter()
+            ok, frame = cap.read()
+            decode = time.perf_counter() - start
+            if not ok:
+                return
+            if width and frame.shape[1] != width:
+                frame = resize_to_width(frame, width)
+            count += 1
+            yield frame, decode, None
+    finally:
+        cap.release()
+
+
+def resize_to_width(frame, width):
+    height = int(round(frame.shape[0] * width / frame.shape[1]))
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far; None where the resource module is missing"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize_stages(samples, wall_seconds):
+    """Per-stage p50/p95/p99/mean in ms plus overall throughput"""
+    frames = len(samples["total"])
+    stages = {}
+    for stage, values in samples.items():
+        values = np.asarray(values) * 1e3
+        stages[stage] = {
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "mean_ms": float(values.mean()),
+        }
+    return {"frames": frames, "fps": frames / wall_seconds if wall_seconds else 0.0, "stages": stages}
+
+
+def record_sample(samples, timings):
+    for stage, seconds in timings.items():
+        samples.setdefault(stage, []).append(seconds)
+
+
+def replay_desktop(args):
+    """DoomscrollDetector.analyze on every frame: decode, color, face, eyes/landmarks, scoring"""
+    detector = DoomscrollDetector(args.config)
+    samples = {}
+    wall = time.perf_counter()
+    for frame, decode, _ in iter_frames(args.input, args.width, args.limit):
+        timings = {"decode": decode}
+        start = time.perf_counter()
+        detector.analyze(frame, timings)
+        timings["total"] = decode + time.perf_counter() - start
+        record_sample(samples, timings)
+    result = summarize_stages(samples, time.perf_counter() - wall)
+    result["backend"] = detector.backend.label
+    return result
+
+
+def replay_api(args):
+    """DoomscrollDetectorAPI on JPEG uploads: decode (straight to gray), face, eyes/landmarks, scoring"""
+    from detector import DoomscrollDetectorAPI, decode_gray, load_config
+
+    config = load_config()
+    detector = DoomscrollDetectorAPI(config)
+    tracker = FaceTracker.from_config(config)
+
+    # Encode up front so only the server-side work is timed
+    uploads = []
+    for frame, _, data in iter_frames(args.input, args.width, args.limit):
+        if data is None:
+            data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+        uploads.append(data)
+
+    samples = {}
+    wall = time.perf_counter()
+    for data in uploads:
+        start = time.perf_counter()
+        gray = decode_gray(data, args.reduce)
+        timings = {"decode": time.perf_counter() - start}
+        detector.detect_doomscroll(gray, args.reduce, tracker, timings)
+        timings["total"] = time.perf_counter() - start
+        record_sample(samples, timings)
+    result = summarize_stages(samples, time.perf_counter() - wall)
+    result["backend"] = detector.backend.label
+    result["upload_bytes_mean"] = float(np.mean([len(d) for d in uploads])) if uploads else 0.0
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def replay(args):
+    """Replay a video or frame directory through the detectors headlessly and report per-stage latency"""
+    report = {"input": args.input, "revision": git_revision(), "width": args.width, "targets": {}}
+    runners = {"desktop": replay_desktop, "api": replay_api}
+    targets = list(runners) if args.target == "both" else [args.target]
+
+    for target in targets:
+        result = runners[target](args)
+        result["peak_rss_mb"] = peak_rss_mb()
+        report["targets"][target] = result
+
+        peak_rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else "n/a"
+        print(f"{target} ({result['backend']}): {result['frames']} frames, {result['fps']:.1f} fps, "
+              f"peak RSS {peak_rss}")
+        print(f"  {'stage':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for stage, stats in result["stages"].items():
+            print(f"  {stage:<10} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the doomscroll detectors")
+    parser.add_argument("--config", default="config.json")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scales = subparsers.add_parser("scales", help="latency/agreement table for detection.scale values")
+    scales.add_argument("--video", default="rickroll.mp4")
+    scales.add_argument("--width", type=int, default=480, help="resize frames to this width first")
+    scales.add_argument("--limit", type=int, help="max frames to use")
+    scales.add_argument("--scales", type=lambda s: [float(v) for v in s.split(",")],
+                        default=[1.0, 0.75, 0.5, 0.25])
+    scales.add_argument("--output", help="also write results as JSON")
+    scales.set_defaults(func=sweep_scales)
+
+    scoring = subparsers.add_parser("scoring", help="microbenchmark of per-face landmark and Haar scoring overhead")
+    scoring.add_argument("--faces", type=lambda s: [int(v) for v in s.split(",")], default=[1, 4, 16, 64])
+    scoring.add_argument("--repeat", type=int, default=200)
+    scoring.add_argument("--output", help="also write results as JSON")
+    scoring.set_defaults(func=microbench_scoring)
+
+    replay_parser = subparsers.add_parser("replay", help="headless per-stage latency on a video or frame directory")
+    replay_parser.add_argument("--input", default="rickroll.mp4", help="video file or directory of images")
+    replay_parser.add_argument("--target", choices=["desktop", "api", "both"], default="both")
+    replay_parser.add_argument("--width", type=int, help="resize frames to this width first")
+    replay_parser.add_argument("--limit", type=int, help="max frames to use")
+    replay_parser.add_argument("--reduce", type=int, default=1, help="API decode reduction (1, 2, 4, 8)")
+    replay_parser.add_argument("--output", help="write the report as JSON")
+    replay_parser.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
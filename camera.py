@@ -0,0 +1,176 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Indices tried after camera.preferred_index when it doesn't open
+FALLBACK_INDICES = (0, 1)
+
+
+def candidate_indices(camera_config):
+    """Device indices to try, preferred first"""
+    preferred = camera_config.get('preferred_index', 0)
+    fallbacks = camera_config.get('fallback_indices', FALLBACK_INDICES)
+    return [preferred] + [index for index in fallbacks if index != preferred]
+
+
+def fourcc_name(code):
+    code = int(code)
+    return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)) if code else "?"
+
+
+def configure_capture(cap, camera_config):
+    """Apply pixel format, resolution, FPS and driver buffer size from the `camera` config section
+
+    Drivers silently ignore what they don't support, so the values actually
+    in effect are read back and logged.
+    """
+    # Pixel format first: on V4L2 the available sizes and rates depend on it
+    fourcc = camera_config.get('fourcc')
+    if fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if camera_config.get('width'):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, camera_config['width'])
+    if camera_config.get('height'):
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, camera_config['height'])
+    if camera_config.get('fps'):
+        cap.set(cv2.CAP_PROP_FPS, camera_config['fps'])
+    if camera_config.get('buffer_size'):
+        # Few queued frames = fresh frames after the consumer has been idle
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, camera_config['buffer_size'])
+
+    logger.info(f"Camera format: {int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))} "
+                f"@ {cap.get(cv2.CAP_PROP_FPS):.0f} fps, {fourcc_name(cap.get(cv2.CAP_PROP_FOURCC))}")
+
+
+def frame_brightness(frame):
+    """Mean intensity of a strided sample of the frame, enough to follow auto-exposure"""
+    return float(frame[::8, ::8].mean())
+
+
+def warm_up(cap, max_seconds=2.0, tolerance=2.0, stable_frames=3):
+    """Read frames until auto-exposure settles; returns the last good frame or None
+
+    Settled means the mean brightness moved by less than `tolerance` for
+    `stable_frames` frames in a row (all-black frames don't count). Gives up
+    waiting for convergence after `max_seconds` and uses what it has.
+    """
+    deadline = time.monotonic() + max_seconds
+    previous, stable, frame = None, 0, None
+    while time.monotonic() < deadline:
+        success, current = cap.read()
+        if not success or current is None or current.size == 0:
+            time.sleep(0.01)
+            continue
+        frame = current
+        brightness = frame_brightness(frame)
+        if previous is not None and brightness > 1.0 and abs(brightness - previous) < tolerance:
+            stable += 1
+            if stable >= stable_frames:
+                break
+        else:
+            stable = 0
+        previous = brightness
+    return frame
+
+
+def open_camera(index, camera_config):
+    """Open, configure and warm up one device; returns the capture or None"""
+    start = time.monotonic()
+    cap = None
+    try:
+        cap = cv2.VideoCapture(index)
+        if not cap.isOpened():
+            logger.warning(f"Failed to open camera index {index}")
+            cap.release()
+            return None
+
+        configure_capture(cap, camera_config)
+        frame = warm_up(cap, camera_config.get('warmup_seconds', 2.0), camera_config.get('warmup_tolerance', 2.0))
+    except Exception as e:
+        logger.error(f"Error initializing camera {index}: {e}")
+        if cap is not None:
+            cap.release()
+        return None
+
+    if frame is None:
+        logger.warning(f"Failed to grab frame from camera {index}")
+        cap.release()
+        return None
+
+    logger.info(f"Camera {index} ready in {(time.monotonic() - start) * 1e3:.0f} ms")
+    return cap
+
+
+def _release(future):
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result().release()
+
+
+def probe_cameras(indices, camera_config):
+    """Open every candidate concurrently; returns (index, capture) or (None, None)
+
+    The first device in `indices` order that delivers frames wins, without
+    waiting on lower-priority devices; a higher-priority one that is still
+    warming up is waited for, so the preferred camera keeps precedence.
+    Every other capture is released.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(indices), thread_name_prefix="camera-probe")
+    futures = {executor.submit(open_camera, index, camera_config): index for index in indices}
+    by_index = {index: future for future, index in futures.items()}
+    winner = None
+    try:
+        for index in indices:
+            cap = by_index[index].result()
+            if cap is not None:
+                winner = index
+                return index, cap
+        return None, None
+    finally:
+        for future, index in futures.items():
+            if index != winner:
+                # Release now if finished, otherwise as soon as it finishes
+                future.add_done_callback(_release)
+        executor.shutdown(wait=False)
+
+
+class CameraConnector:
+    """Opens the webcam and reopens it after a disconnect
+
+    The last device that worked is tried alone first; only if it fails are
+    all candidates probed in parallel. Failed attempts back off
+    exponentially from `initial_retry_delay_seconds` to `retry_delay_seconds`.
+    """
+
+    def __init__(self, camera_config):
+        self.camera_config = camera_config
+        self.last_good_index = None
+        self.initial_delay = camera_config.get('initial_retry_delay_seconds', 0.25)
+        self.max_delay = camera_config.get('retry_delay_seconds', 5)
+        self._delay = self.initial_delay
+
+    def connect(self):
+        """An open, warmed-up capture, or None if no device delivered frames"""
+        if self.last_good_index is not None:
+            cap = open_camera(self.last_good_index, self.camera_config)
+            if cap is not None:
+                self._delay = self.initial_delay
+                return cap
+            logger.warning(f"Camera {self.last_good_index} did not come back, probing all devices")
+
+        candidates = candidate_indices(self.camera_config)
+        logger.info(f"Probing camera indices {candidates}...")
+        index, cap = probe_cameras(candidates, self.camera_config)
+        if cap is not None:
+            self.last_good_index = index
+            self._delay = self.initial_delay
+        return cap
+
+    def next_retry_delay(self):
+        """Seconds to wait before the next attempt; doubles on every call until connect() succeeds"""
+        delay = self._delay
+        self._delay = min(self._delay * 2, self.max_delay)
+        return delay
@@ -0,0 +1,472 @@
+import time
+
+import cv2
+import numpy as np
+
+from logging_setup import sampled_logger
+
+# Scoring thresholds; keys match the `detection` section of config.json
+DEFAULT_THRESHOLDS = {
+    # Haar scoring: face centre low in the frame, squashed face, eyes low in the face box
+    "face_position_ratio": 0.58,
+    "face_position_ratio_low": 0.52,
+    "face_aspect_ratio": 1.1,
+    "eye_position_ratio": 0.6,
+    "eye_position_ratio_low": 0.52,
+    "score_threshold": 3,
+    # dlib landmarks: head tilted forward or eyes looking down
+    "head_tilt": 1.3,
+    "eye_ratio": 0.35,
+}
+
+# The 68-point landmarks the scoring needs: chin, forehead, nose tip, then both eye contours.
+# Landmark arrays use this compact layout; the constants below index into it.
+SCORED_LANDMARKS = (8, 27, 30) + tuple(range(36, 48))
+CHIN, FOREHEAD, NOSE_TIP = 0, 1, 2
+EYES = slice(3, 15)
+
+# Up to this many faces landmark scoring runs in plain Python floats: numpy's
+# per-call overhead outweighs the arithmetic for a handful of faces
+SMALL_BATCH_FACES = 8
+
+# Per-face values of an analysis dict reported in frame diagnostics (Haar or dlib keys, whichever exist)
+DIAGNOSTIC_KEYS = ("score", "face_ratio", "eye_level", "eye_count", "head_tilt", "eye_ratio")
+
+diagnostics = sampled_logger("doomscroll.detection")
+
+
+def downscale(gray, scale):
+    """Shrink a grayscale frame for the face search (no-op at scale >= 1)"""
+    if scale >= 1.0:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def upscale_boxes(faces, scale):
+    """Map (x, y, w, h) boxes found on a downscaled frame back to full resolution"""
+    if scale >= 1.0 or len(faces) == 0:
+        return faces
+    return np.round(np.asarray(faces) / scale).astype(np.int32)
+
+
+def upscale_rect(rect, scale):
+    """Same as upscale_boxes, for a single dlib rectangle"""
+    if scale >= 1.0:
+        return rect
+    return rect.__class__(
+        int(round(rect.left() / scale)), int(round(rect.top() / scale)),
+        int(round(rect.right() / scale)), int(round(rect.bottom() / scale))
+    )
+
+
+def largest_box(faces):
+    """Return the (x, y, w, h) with the biggest area, or None if there are none"""
+    if len(faces) == 0:
+        return None
+    return tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+
+
+class FaceTracker:
+    """Limits the face cascade to a window around the last known face
+
+    A full-frame search runs every `full_search_interval` frames, or as soon
+    as the face is lost. In between, only an expanded window around the last
+    face box is scanned, with minSize/maxSize narrowed to the tracked face
+    size. Only the tracked (largest) face is followed between full searches.
+
+    The tracker only holds plain attributes so it can be handed to a worker
+    process and returned with its updated state.
+    """
+
+    def __init__(self, full_search_interval=10, padding=0.5, size_tolerance=0.3, roi_scale_factor=1.1):
+        self.full_search_interval = full_search_interval
+        self.padding = padding
+        self.size_tolerance = size_tolerance
+        self.roi_scale_factor = roi_scale_factor
+        self.box = None
+        self.frames_since_full_search = 0
+        self.full_searches = 0
+        self.roi_searches = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the `detection.tracking` config section (disabled = full search every frame)"""
+        tracking = config.get('detection', {}).get('tracking', {})
+        if not tracking.get('enabled', True):
+            return cls(full_search_interval=0)
+        return cls(
+            full_search_interval=tracking.get('full_search_interval', 10),
+            padding=tracking.get('padding', 0.5),
+            size_tolerance=tracking.get('size_tolerance', 0.3),
+            roi_scale_factor=tracking.get('roi_scale_factor', 1.1)
+        )
+
+    def reset(self):
+        self.box = None
+        self.frames_since_full_search = 0
+
+    def locate(self, gray, cascade, scale_factor=1.3, min_neighbors=5):
+        """Find faces in `gray`, searching only near the last face when possible"""
+        if self.box is not None and self.frames_since_full_search < self.full_search_interval:
+            faces = self._search_window(gray, cascade, min_neighbors)
+            if len(faces):
+                self.roi_searches += 1
+                self.frames_since_full_search += 1
+                self.box = largest_box(faces)
+                return faces
+
+        # Periodic refresh, or the track was lost: scan the whole frame
+        faces = cascade.detectMultiScale(gray, scale_factor, min_neighbors)
+        self.full_searches += 1
+        self.frames_since_full_search = 0
+        self.box = largest_box(faces)
+        return faces
+
+    def _search_window(self, gray, cascade, min_neighbors):
+        x, y, w, h = self.box
+        frame_h, frame_w = gray.shape[:2]
+        pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(frame_w, x + w + pad_x), min(frame_h, y + h + pad_y)
+
+        min_side = max(1, int(min(w, h) * (1 - self.size_tolerance)))
+        max_side = int(max(w, h) * (1 + self.size_tolerance))
+        max_side = min(max_side, x1 - x0, y1 - y0)
+        if max_side < min_side:
+            return ()
+
+        faces = cascade.detectMultiScale(
+            gray[y0:y1, x0:x1], self.roi_scale_factor, min_neighbors,
+            minSize=(min_side, min_side), maxSize=(max_side, max_side)
+        )
+        if len(faces) == 0:
+            return ()
+        # Back to full-frame coordinates
+        return faces + np.array([x0, y0, 0, 0], dtype=faces.dtype)
+
+
+class MotionGate:
+    """Skips detection when the frame has barely changed since the last analyzed one
+
+    Compares a tiny grayscale thumbnail against the thumbnail of the last
+    frame that was actually analyzed, using the mean absolute difference
+    (0-255 scale). Below `threshold` the caller reuses its previous result.
+    A full detection is still forced every `max_reuse` skipped frames so a
+    slow drift or a lighting change can't pin a stale result forever.
+
+    Like FaceTracker it only holds plain attributes (and keeps the reused
+    result) so it can be handed to a worker process and returned.
+    """
+
+    def __init__(self, enabled=True, threshold=2.0, thumbnail_size=32, max_reuse=15):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.thumbnail_size = thumbnail_size
+        self.max_reuse = max_reuse
+        self.reference = None
+        self._pending = None
+        self.result = None
+        self.reused_in_a_row = 0
+        self.analyzed = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the `detection.motion_gate` config section"""
+        gate = config.get('detection', {}).get('motion_gate', {})
+        return cls(
+            enabled=gate.get('enabled', True),
+            threshold=gate.get('threshold', 2.0),
+            thumbnail_size=gate.get('thumbnail_size', 32),
+            max_reuse=gate.get('max_reuse', 15)
+        )
+
+    def thumbnail(self, image):
+        """Tiny grayscale copy; BGR input is shrunk before the color conversion"""
+        size = (self.thumbnail_size, self.thumbnail_size)
+        # Strided pick down to ~4x the thumbnail first; INTER_AREA over a full frame costs milliseconds
+        step = max(1, min(image.shape[:2]) // (4 * self.thumbnail_size))
+        small = cv2.resize(image[::step, ::step], size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def check(self, image):
+        """Return the previous result if `image` is unchanged enough to reuse it, else None
+
+        On None the caller runs detection and hands the outcome to store().
+        """
+        if not self.enabled:
+            self.analyzed += 1
+            return None
+
+        thumb = self.thumbnail(image)
+        if (self.result is not None and self.reference is not None
+                and self.reused_in_a_row < self.max_reuse
+                and cv2.norm(thumb, self.reference, cv2.NORM_L1) / thumb.size < self.threshold):
+            self.reused_in_a_row += 1
+            self.skipped += 1
+            return self.result
+
+        self._pending = thumb
+        self.analyzed += 1
+        return None
+
+    def store(self, result):
+        """Remember the result of the frame check() just let through"""
+        if not self.enabled:
+            return
+        if self._pending is not None:
+            self.reference, self._pending = self._pending, None
+        self.result = result
+        self.reused_in_a_row = 0
+
+    def reset(self):
+        self.reference = self._pending = None
+        self.result = None
+        self.reused_in_a_row = 0
+
+    @property
+    def skip_rate(self):
+        total = self.analyzed + self.skipped
+        return self.skipped / total if total else 0.0
+
+    def summary(self):
+        return f"motion gate skipped {self.skip_rate:.0%} of {self.analyzed + self.skipped} frames"
+
+
+def load_thresholds(config):
+    """Scoring thresholds from the config `detection` section, falling back to the defaults"""
+    detection = config.get('detection', {})
+    return {key: detection.get(key, default) for key, default in DEFAULT_THRESHOLDS.items()}
+
+
+def _landmark_weights():
+    """(15, 8) matrix turning SCORED_LANDMARKS y-coordinates into every quantity the scoring needs
+
+    Columns: lid tops (left, right), lid bottoms (left, right), eye centres
+    (left, right), chin minus nose tip, nose tip minus forehead.
+    """
+    weights = np.zeros((len(SCORED_LANDMARKS), 8))
+    for eye, first in enumerate((EYES.start, EYES.start + 6)):
+        weights[[first + 1, first + 2], eye] = 0.5      # top lid
+        weights[[first + 4, first + 5], 2 + eye] = 0.5  # bottom lid
+        weights[[first, first + 3], 4 + eye] = 0.5      # eye corners
+    weights[[CHIN, NOSE_TIP], 6] = (1, -1)
+    weights[[NOSE_TIP, FOREHEAD], 7] = (1, -1)
+    return weights
+
+
+_LANDMARK_WEIGHTS = _landmark_weights()
+
+
+def landmarks_to_array(shapes, indices=SCORED_LANDMARKS):
+    """Convert dlib full_object_detections to an (N, n, 2) int array in one pass
+
+    Defaults to the compact SCORED_LANDMARKS layout: every point read is a
+    Python-level call into dlib, so only the points the scoring uses are
+    fetched. Pass indices=None for all 68 parts.
+    """
+    if indices is None:
+        indices = range(68)
+    coords = (c for shape in shapes for point in map(shape.part, indices) for c in (point.x, point.y))
+    count = 2 * len(indices) * len(shapes)
+    return np.fromiter(coords, dtype=np.int32, count=count).reshape(len(shapes), len(indices), 2)
+
+
+def _is_scalar(value):
+    # tune.py passes (C, 1) arrays to score a grid of candidates at once
+    return not isinstance(value, np.ndarray)
+
+
+def _score_few_landmarks(landmarks, thresholds):
+    """score_landmarks() for up to SMALL_BATCH_FACES faces, in plain floats"""
+    looking, eye_ratios, head_tilts = [], [], []
+    for ys in landmarks[:, :, 1].tolist():
+        ratios = []
+        for first in (EYES.start, EYES.start + 6):
+            top = (ys[first + 1] + ys[first + 2]) / 2
+            bottom = (ys[first + 4] + ys[first + 5]) / 2
+            center = (ys[first] + ys[first + 3]) / 2
+            ratios.append(abs(center - top) / (abs(bottom - top) + 1e-6))
+        eye_ratio = (ratios[0] + ratios[1]) / 2
+        head_tilt = (ys[CHIN] - ys[NOSE_TIP]) / (ys[NOSE_TIP] - ys[FOREHEAD] + 1e-6)
+        looking.append(head_tilt > thresholds["head_tilt"] or eye_ratio < thresholds["eye_ratio"])
+        eye_ratios.append(eye_ratio)
+        head_tilts.append(head_tilt)
+    return {"looking_down": np.array(looking, dtype=bool), "eye_ratio": np.array(eye_ratios, dtype=np.float64),
+            "head_tilt": np.array(head_tilts, dtype=np.float64)}
+
+
+def score_landmarks(landmarks, thresholds):
+    """Score a batch of (N, 15, 2) SCORED_LANDMARKS sets; returns per-face arrays"""
+    if len(landmarks) <= SMALL_BATCH_FACES and _is_scalar(thresholds["head_tilt"]) and _is_scalar(thresholds["eye_ratio"]):
+        return _score_few_landmarks(landmarks, thresholds)
+
+    combos = landmarks[..., 1] @ _LANDMARK_WEIGHTS
+    top, bottom, center = combos[:, :6].reshape(-1, 3, 2).transpose(1, 0, 2)
+
+    # Vertical position of each eye centre between its lids, averaged over both eyes
+    eye_ratio = (np.abs(center - top) / (np.abs(bottom - top) + 1e-6)).mean(axis=1)
+    head_tilt = combos[:, 6] / (combos[:, 7] + 1e-6)
+
+    looking_down = (head_tilt > thresholds["head_tilt"]) | (eye_ratio < thresholds["eye_ratio"])
+    return {"looking_down": looking_down, "eye_ratio": eye_ratio, "head_tilt": head_tilt}
+
+
+def haar_features(faces, eyes, frame_height):
+    """Per-face quantities the Haar scoring thresholds apply to: face ratio, aspect, eye count, eye level"""
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 4)
+    y, w, h = faces[:, 1], faces[:, 2], faces[:, 3]
+    face_ratio = (y + h // 2) / frame_height
+    eye_count = np.array([len(e) for e in eyes], dtype=np.int64)
+    eye_center_y = np.array([(e[:, 1] + e[:, 3] // 2).mean() if len(e) >= 2 else np.nan for e in eyes])
+    eye_level = np.where(eye_count >= 2, (eye_center_y - y) / h, 0.0)
+    return {"face_ratio": face_ratio, "aspect": h / w, "eye_count": eye_count, "eye_level": eye_level}
+
+
+def score_haar_features(features, thresholds):
+    """Scores for haar_features() output
+
+    Plain comparisons only, so thresholds given as (C, 1) arrays score C
+    threshold sets at once and return (C, N) arrays (see tune.py).
+    """
+    face_ratio, eye_level = features["face_ratio"], features["eye_level"]
+
+    # 1. Face position - face centre in the lower part of the frame = looking down
+    score = np.where(face_ratio > thresholds["face_position_ratio"], 2,
+                     np.where(face_ratio > thresholds["face_position_ratio_low"], 1, 0))
+
+    # 2. Aspect ratio - looking down makes the face appear shorter/wider
+    score = score + (features["aspect"] < thresholds["face_aspect_ratio"])
+
+    # 3. Eye level inside the face box; too few eyes found also counts as suspicious
+    score = score + np.where(features["eye_count"] >= 2,
+                             np.where(eye_level > thresholds["eye_position_ratio"], 2,
+                                      np.where(eye_level > thresholds["eye_position_ratio_low"], 1, 0)),
+                             1)
+    return score, score >= thresholds["score_threshold"]
+
+
+def score_haar_faces(faces, eyes, frame_height, thresholds):
+    """Score Haar face boxes and their eye boxes (frame coordinates) for one threshold set; returns per-face arrays
+
+    Same scores as score_haar_features(haar_features(...)), in plain floats:
+    the per-face eye lists would make the batch version loop in Python
+    anyway, and for the usual one or two faces numpy's per-call overhead
+    costs more than the arithmetic.
+    """
+    t = thresholds
+    looking, scores, ratios, levels, counts = [], [], [], [], []
+    for (x, y, w, h), face_eyes in zip(faces.tolist(), eyes):
+        face_ratio = (y + h // 2) / frame_height
+        score = 2 if face_ratio > t["face_position_ratio"] else 1 if face_ratio > t["face_position_ratio_low"] else 0
+        score += h / w < t["face_aspect_ratio"]
+        count = len(face_eyes)
+        if count >= 2:
+            eye_level = (sum(ey + eh // 2 for _, ey, _, eh in face_eyes.tolist()) / count - y) / h
+            score += 2 if eye_level > t["eye_position_ratio"] else 1 if eye_level > t["eye_position_ratio_low"] else 0
+        else:
+            eye_level = 0.0
+            score += 1
+        looking.append(score >= t["score_threshold"])
+        scores.append(score)
+        ratios.append(face_ratio)
+        levels.append(eye_level)
+        counts.append(count)
+    return {
+        "looking_down": np.array(looking, dtype=bool),
+        "score": np.array(scores, dtype=np.int64),
+        "face_ratio": np.array(ratios, dtype=np.float64),
+        "eye_level": np.array(levels, dtype=np.float64),
+        "eye_count": np.array(counts, dtype=np.int64),
+    }
+
+
+def find_faces_haar(gray, face_cascade, scale=1.0, tracker=None, scale_factor=1.3, min_neighbors=5):
+    """Face boxes (N, 4) in full-resolution coordinates, searched on a downscaled copy"""
+    small = downscale(gray, scale)
+    if tracker is not None:
+        faces = tracker.locate(small, face_cascade, scale_factor, min_neighbors)
+    else:
+        faces = face_cascade.detectMultiScale(small, scale_factor, min_neighbors)
+    return np.asarray(upscale_boxes(faces, scale), dtype=np.int32).reshape(-1, 4)
+
+
+def find_eyes(gray, faces, eye_cascade, scale_factor=1.1, min_neighbors=5):
+    """Eye boxes for each face, searched in the upper 60% of the face and returned in frame coordinates"""
+    eyes = []
+    for x, y, w, h in faces:
+        found = eye_cascade.detectMultiScale(gray[y:y+int(h*0.6), x:x+w], scale_factor, min_neighbors)
+        found = np.asarray(found, dtype=np.int32).reshape(-1, 4)
+        eyes.append(found + np.array([x, y, 0, 0], dtype=np.int32))
+    return eyes
+
+
+def analyze_haar(gray, face_cascade, eye_cascade, thresholds, scale=1.0, tracker=None, timings=None,
+                 origin=(0, 0), frame_height=None, face_params=(1.3, 5), eye_params=(1.1, 5)):
+    """Full Haar pass: faces, eyes and batch scores for every face in the frame
+
+    If `gray` is a crop of a larger frame, `origin` is the crop's top-left
+    corner and `frame_height` the full frame height; boxes are returned and
+    scored in full-frame coordinates. If a `timings` dict is given,
+    per-stage seconds are stored under "face", "eyes" and "scoring".
+    `face_params` and `eye_params` are the (scale_factor, min_neighbors)
+    passed to detectMultiScale for each cascade.
+    """
+    start = time.perf_counter()
+    faces = find_faces_haar(gray, face_cascade, scale, tracker, *face_params)
+    face_done = time.perf_counter()
+    eyes = find_eyes(gray, faces, eye_cascade, *eye_params)
+    eyes_done = time.perf_counter()
+    if origin != (0, 0):
+        shift = np.array([origin[0], origin[1], 0, 0], dtype=np.int32)
+        faces = faces + shift
+        eyes = [e + shift for e in eyes]
+    analysis = score_haar_faces(faces, eyes, frame_height or gray.shape[0], thresholds)
+    analysis.update(faces=faces, eyes=eyes)
+
+    if timings is not None:
+        timings["face"] = face_done - start
+        timings["eyes"] = eyes_done - face_done
+        timings["scoring"] = time.perf_counter() - eyes_done
+    return analysis
+
+
+def analyze_dlib(gray, face_detector, predictor, thresholds, scale=1.0, timings=None, origin=(0, 0)):
+    """Full dlib pass: HOG faces, (N, 15, 2) SCORED_LANDMARKS and batch scores
+
+    `origin` offsets the returned faces and landmarks when `gray` is a crop
+    (the landmark scores are position independent). If a `timings` dict is
+    given, per-stage seconds are stored under "face", "landmarks" and "scoring".
+    """
+    start = time.perf_counter()
+    rects = [upscale_rect(rect, scale) for rect in face_detector(downscale(gray, scale))]
+    face_done = time.perf_counter()
+    faces = np.array([(r.left(), r.top(), r.width(), r.height()) for r in rects], dtype=np.int32).reshape(-1, 4)
+    landmarks = landmarks_to_array([predictor(gray, rect) for rect in rects])
+    landmarks_done = time.perf_counter()
+
+    analysis = score_landmarks(landmarks, thresholds)
+    if origin != (0, 0):
+        faces = faces + np.array([origin[0], origin[1], 0, 0], dtype=np.int32)
+        landmarks = landmarks + np.array(origin, dtype=np.int32)
+    analysis.update(faces=faces, landmarks=landmarks)
+
+    if timings is not None:
+        timings["face"] = face_done - start
+        timings["landmarks"] = landmarks_done - face_done
+        timings["scoring"] = time.perf_counter() - landmarks_done
+    return analysis
+
+
+def log_diagnostics(backend, analysis):
+    """Sampled structured record of one analyzed frame: per-face scores and the result"""
+    if not diagnostics.should_log():
+        return
+    fields = {"backend": backend, "faces": len(analysis["faces"]),
+              "looking_down": bool(analysis["looking_down"].any())}
+    for key in DIAGNOSTIC_KEYS:
+        if key in analysis:
+            fields[key] = np.round(analysis[key], 3).tolist()
+    diagnostics.log("detection", fields)
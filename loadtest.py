@@ -0,0 +1,370 @@
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+from benchmark import git_revision, iter_frames
+from detector import CONFIG_PATH_ENV
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Client behaviour mirrored from web/static/app.js
+BAD_DETECTION_THRESHOLD = 1
+RETRY_DELAY_MS = 1500
+JPEG_QUALITY = 80
+
+# Statuses that mean the server shed load rather than failed
+SHED_STATUSES = (429, 503)
+
+SERVER_START_TIMEOUT_SECONDS = 60
+RESOURCE_SAMPLE_SECONDS = 0.5
+
+
+class Replay:
+    """A video decoded once into mirrored grayscale frames, played back in real time by every session
+
+    Frames are mirrored and grayscale like the browser's detection canvas.
+    Full frames are JPEG-encoded up front; crops (when the server hands out
+    a crop hint) are encoded per request.
+    """
+
+    def __init__(self, path, width=640, fps=None, limit=None):
+        self.frames, self.jpegs = [], []
+        for frame, _, _ in iter_frames(path, width, limit):
+            gray = cv2.flip(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1)
+            self.frames.append(gray)
+            self.jpegs.append(self.encode(gray))
+        if not self.frames:
+            raise SystemExit(f"No frames in {path}")
+        cap = cv2.VideoCapture(path) if os.path.isfile(path) else None
+        self.fps = fps or (cap.get(cv2.CAP_PROP_FPS) if cap is not None else 0) or 30.0
+        if cap is not None:
+            cap.release()
+
+    @staticmethod
+    def encode(gray):
+        return cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])[1].tobytes()
+
+    def upload(self, elapsed, crop=None):
+        """JPEG of the frame showing `elapsed` seconds in (looping), cropped like app.js does; returns (body, query)"""
+        index = int(elapsed * self.fps) % len(self.frames)
+        if crop is None:
+            return self.jpegs[index], ""
+        gray = self.frames[index]
+        frame_height, frame_width = gray.shape
+        # Mirror of uploadRegion(): the hint clamped to the frame
+        x = max(0, min(crop["x"], frame_width - 1))
+        y = max(0, min(crop["y"], frame_height - 1))
+        w, h = min(crop["w"], frame_width - x), min(crop["h"], frame_height - y)
+        body = self.encode(gray[y:y + h, x:x + w])
+        return body, f"?crop_x={x}&crop_y={y}&frame_height={frame_height}"
+
+
+class ClientSession(threading.Thread):
+    """One simulated browser tab: a keep-alive HTTP connection sending frames at the server's cadence
+
+    Like app.js, only one frame is in flight at a time and the next one is
+    sent `next_capture_ms` after the response (or after Retry-After, or
+    RETRY_DELAY_MS on an error); crop hints are followed, and consecutive bad
+    results count towards BAD_DETECTION_THRESHOLD. Dismissing the rickroll
+    is a user action and is not simulated.
+    """
+
+    def __init__(self, host, port, endpoint, replay, start_at, stop_at, samples):
+        super().__init__(name="loadtest-session", daemon=True)
+        self.host, self.port = host, port
+        self.endpoint = endpoint
+        self.replay = replay
+        self.start_at, self.stop_at = start_at, stop_at
+        self.samples = samples
+        self.session_id = str(uuid.uuid4())
+        # Sessions start at different points of the clip, like different people
+        self.offset = random.uniform(0, len(replay.frames) / replay.fps)
+        self.consecutive_bad = 0
+        self.episodes = 0
+
+    def request(self, conn, body, query):
+        headers = {"X-Session-Id": self.session_id}
+        if self.endpoint == "json":
+            body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(body).decode()})
+            headers["Content-Type"] = "application/json"
+            conn.request("POST", "/api/detect", body, headers)
+        else:
+            headers["Content-Type"] = "image/jpeg"
+            conn.request("POST", "/api/detect/frame" + query, body, headers)
+        response = conn.getresponse()
+        return response.status, response.getheader("Retry-After"), response.read()
+
+    def run(self):
+        time.sleep(max(0.0, self.start_at - time.monotonic()))
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        crop = None
+        while time.monotonic() < self.stop_at:
+            # /api/detect takes no crop parameters, so it always gets full frames
+            body, query = self.replay.upload(time.monotonic() - self.start_at + self.offset,
+                                             crop if self.endpoint == "frame" else None)
+            delay_ms = RETRY_DELAY_MS
+            start = time.monotonic()
+            try:
+                status, retry_after, payload = self.request(conn, body, query)
+            except (OSError, http.client.HTTPException):
+                status, retry_after, payload = None, None, b""
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            done = time.monotonic()
+
+            next_capture_ms = None
+            if status == 200:
+                result = json.loads(payload)
+                crop = result.get("crop")
+                if result["doomscrolling"]:
+                    self.consecutive_bad += 1
+                    if self.consecutive_bad == BAD_DETECTION_THRESHOLD:
+                        self.episodes += 1
+                else:
+                    self.consecutive_bad = 0
+                delay_ms = next_capture_ms = result["next_capture_ms"]
+            else:
+                crop = None
+                if status in SHED_STATUSES and retry_after:
+                    try:
+                        delay_ms = float(retry_after) * 1000
+                    except ValueError:
+                        pass
+            self.samples.append((done, done - start, status, len(body), next_capture_ms))
+
+            time.sleep(max(0.0, min(delay_ms / 1000, self.stop_at - time.monotonic())))
+        conn.close()
+
+
+def process_tree(pid):
+    """`pid` and all its descendants (uvicorn/gunicorn workers), from /proc"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def read_usage(pids):
+    """(CPU seconds, RSS bytes) summed over `pids`; processes that exited count as zero"""
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu, rss = 0.0, 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # The command name may contain spaces; fields after it are fixed
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+        rss += int(fields[21]) * page
+    return cpu, rss
+
+
+class ResourceSampler(threading.Thread):
+    """Server CPU and RSS from /proc every RESOURCE_SAMPLE_SECONDS (Linux only; nothing elsewhere)"""
+
+    def __init__(self, pid):
+        super().__init__(name="loadtest-resources", daemon=True)
+        self.pid = pid
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        if self.pid is None or not os.path.exists(f"/proc/{self.pid}"):
+            return
+        while not self._stop_event.is_set():
+            cpu, rss = read_usage(process_tree(self.pid))
+            self.samples.append((time.monotonic(), cpu, rss))
+            self._stop_event.wait(RESOURCE_SAMPLE_SECONDS)
+
+    def summary(self, since):
+        samples = [s for s in self.samples if s[0] >= since]
+        if len(samples) < 2:
+            return {"cpu_cores": None, "rss_mb_mean": None, "rss_mb_peak": None}
+        rss = np.array([s[2] for s in samples]) / (1024 * 1024)
+        return {
+            "cpu_cores": (samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0]),
+            "rss_mb_mean": float(rss.mean()),
+            "rss_mb_peak": float(rss.max()),
+        }
+
+
+def run_level(args, replay, users, server_pid):
+    """`users` concurrent sessions for the ramp plus the measured duration; returns that level's row"""
+    samples = []
+    start = time.monotonic() + 0.5
+    measure_from = start + args.ramp
+    stop_at = measure_from + args.duration
+    # Sessions join at random points during the ramp, not all on the same tick
+    sessions = [ClientSession(args.host, args.port, args.endpoint, replay,
+                              start + random.uniform(0, args.ramp), stop_at, samples) for _ in range(users)]
+    sampler = ResourceSampler(server_pid)
+    sampler.start()
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+    sampler.stop()
+
+    measured = [s for s in samples if s[0] >= measure_from]
+    statuses = {}
+    for _, _, status, _, _ in measured:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [s for s in measured if s[2] == 200]
+    shed = sum(1 for s in measured if s[2] in SHED_STATUSES)
+    latencies = np.array([s[1] for s in ok]) * 1e3
+    delays = [s[4] for s in ok]
+    total = len(measured)
+    row = {
+        "users": users,
+        "requests": total,
+        "requests_per_second": total / args.duration,
+        "throughput_fps": len(ok) / args.duration,
+        "latency_ms": {f"p{p}": float(np.percentile(latencies, p)) for p in (50, 90, 95, 99)} if len(ok) else None,
+        "error_rate": (total - len(ok) - shed) / total if total else 0.0,
+        "shed_rate": shed / total if total else 0.0,
+        "statuses": statuses,
+        "upload_bytes_mean": float(np.mean([s[3] for s in measured])) if measured else 0.0,
+        "next_capture_ms_mean": float(np.mean(delays)) if delays else None,
+        "episodes": sum(session.episodes for session in sessions),
+        "server": sampler.summary(measure_from),
+    }
+    row["within_slo"] = bool(row["latency_ms"] is not None and row["latency_ms"]["p95"] <= args.slo_p95_ms
+                             and row["error_rate"] + row["shed_rate"] <= args.slo_failure_rate)
+    return row
+
+
+def wait_for_server(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = http.client.HTTPConnection(host, port, timeout=2)
+        try:
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.5)
+    return False
+
+
+def start_server(args, scratch_dir):
+    """A local uvicorn on args.port running web/app.py, as in the README; returns the process
+
+    The server reads a copy of config.json whose analytics database lives in
+    `scratch_dir`, so simulated sessions never land in the real history.
+    """
+    with open(os.path.join(ROOT_DIR, "config.json")) as f:
+        config = json.load(f)
+    config.setdefault("analytics", {})["path"] = os.path.join(scratch_dir, "doomscroll_stats.db")
+    config_path = os.path.join(scratch_dir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=4, ensure_ascii=False)
+
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", args.host, "--port", str(args.port),
+               "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=os.path.join(ROOT_DIR, "web"),
+                              env={**os.environ, CONFIG_PATH_ENV: config_path})
+    if not wait_for_server(args.host, args.port, SERVER_START_TIMEOUT_SECONDS):
+        server.terminate()
+        raise SystemExit(f"Server did not become healthy on {args.host}:{args.port}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the web API with simulated browser sessions")
+    parser.add_argument("--video", default="rickroll.mp4", help="video (or directory of images) the clients replay")
+    parser.add_argument("--width", type=int, default=640, help="client frame width, like a 640x480 webcam")
+    parser.add_argument("--users", type=lambda s: [int(v) for v in s.split(",")], default=[1, 2, 4, 8, 16],
+                        help="concurrent sessions per level, comma separated")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per level")
+    parser.add_argument("--ramp", type=float, default=5, help="unmeasured seconds while sessions join")
+    parser.add_argument("--endpoint", choices=["frame", "json"], default="frame",
+                        help="raw JPEG /api/detect/frame (what app.js sends) or base64 JSON /api/detect")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--external", action="store_true",
+                        help="use a server already listening on --host/--port instead of starting uvicorn")
+    parser.add_argument("--server-pid", type=int, help="with --external: process to sample CPU/RSS from")
+    parser.add_argument("--slo-p95-ms", type=float, default=500)
+    parser.add_argument("--slo-failure-rate", type=float, default=0.01, help="max error + shed rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the capacity curve as JSON")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    replay = Replay(args.video, args.width)
+    scratch = None if args.external else tempfile.TemporaryDirectory(prefix="doomscroll-loadtest-")
+    server = None if args.external else start_server(args, scratch.name)
+    server_pid = args.server_pid if args.external else server.pid
+
+    levels = []
+    try:
+        print(f"{len(replay.frames)} frames from {args.video} at {replay.fps:.0f} fps, "
+              f"{args.duration:.0f} s per level against {args.host}:{args.port}")
+        print(f"{'users':>5} {'req/s':>7} {'fps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'errors':>7} {'shed':>6} {'CPU':>5} {'RSS MB':>7}")
+        for users in args.users:
+            row = run_level(args, replay, users, server_pid)
+            levels.append(row)
+            latency = row["latency_ms"] or {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+            cpu, rss = row["server"]["cpu_cores"], row["server"]["rss_mb_peak"]
+            print(f"{users:>5} {row['requests_per_second']:>7.1f} {row['throughput_fps']:>7.1f} "
+                  f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+                  f"{row['error_rate']:>7.1%} {row['shed_rate']:>6.1%} "
+                  f"{cpu if cpu is not None else float('nan'):>5.2f} {rss if rss is not None else float('nan'):>7.0f}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if scratch is not None:
+            scratch.cleanup()
+
+    passing = [row["users"] for row in levels if row["within_slo"]]
+    capacity = max(passing) if passing else 0
+    print(f"Capacity: {capacity} concurrent sessions within p95 <= {args.slo_p95_ms:.0f} ms "
+          f"and <= {args.slo_failure_rate:.0%} failed or shed requests")
+
+    if args.output:
+        report = {
+            "revision": git_revision(),
+            "video": args.video,
+            "width": args.width,
+            "endpoint": args.endpoint,
+            "duration_seconds": args.duration,
+            "slo": {"p95_ms": args.slo_p95_ms, "failure_rate": args.slo_failure_rate},
+            "capacity_users": capacity,
+            "levels": levels,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+DEFAULT_SETTINGS = {
+    "level": "INFO",
+    "format": "text",
+    "max_bytes": 5 * 1024 * 1024,
+    "backup_count": 3,
+    "queue_size": 10000,
+    "diagnostics": {
+        "sample_rate": 0.1,
+        "max_per_second": 5
+    }
+}
+
+# Background writer state, replaced on every setup_logging() call and in forked children
+_queue_handler = None
+_listener = None
+_handlers = []
+_fork_hook_registered = False
+
+# Every SampledLogger created by sampled_logger(), reconfigured by setup_logging()
+_sampled = {}
+_diagnostics_settings = dict(DEFAULT_SETTINGS["diagnostics"])
+
+
+class StructuredFormatter(logging.Formatter):
+    """Text lines with the record's structured `fields` (passed via extra=) appended as JSON"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text = f"{text} {json.dumps(fields, separators=(',', ':'))}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any structured fields"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler over a bounded queue that drops records instead of blocking when it is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """The record as the listener's handlers should format it
+
+        The stock prepare() formats the record on the calling thread and
+        drops exc_info, which would leave JsonFormatter without the
+        exception. Only the message arguments are merged here, so later
+        changes to mutable arguments can't alter the logged text.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampledLogger:
+    """Structured records for a sample of events, capped at a rate
+
+    `sample_rate` is the fraction of events kept; `max_per_second` (0 = no
+    cap) is a token bucket on top of that. Callers check `should_log()` first
+    so dropped events never build their message or fields. Events dropped by
+    the rate cap are counted and reported as "suppressed" on the next record.
+    """
+
+    def __init__(self, logger, sample_rate=1.0, max_per_second=0, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+        self._lock = threading.Lock()
+        self.suppressed = 0
+        self.configure(sample_rate, max_per_second)
+
+    def configure(self, sample_rate=1.0, max_per_second=0):
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self._tokens = float(max_per_second)
+        self._refilled = time.monotonic()
+
+    def should_log(self):
+        if self.sample_rate <= 0 or not self.logger.isEnabledFor(self.level):
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if not self.max_per_second:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_second, self._tokens + (now - self._refilled) * self.max_per_second)
+            self._refilled = now
+            if self._tokens < 1:
+                self.suppressed += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def log(self, message, fields):
+        if self.suppressed:
+            with self._lock:
+                fields["suppressed"], self.suppressed = self.suppressed, 0
+        self.logger.log(self.level, message, extra={"fields": fields})
+
+
+def sampled_logger(name):
+    """The SampledLogger for `name`, following the `logging.diagnostics` settings"""
+    sampled = _sampled.get(name)
+    if sampled is None:
+        sampled = _sampled[name] = SampledLogger(logging.getLogger(name), **_diagnostics_settings)
+    return sampled
+
+
+def _start_listener(queue_size):
+    """(Re)start the background thread that hands queued records to the real handlers"""
+    global _listener
+    log_queue = queue.Queue(maxsize=queue_size)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_in_child():
+    # The listener thread doesn't survive fork(); without a new one a forked
+    # worker (process pool, gunicorn) would only fill its copy of the queue
+    if _listener is not None:
+        _start_listener(_listener.queue.maxsize)
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(settings=None, log_file=None, console=True, reroute=()):
+    """Send all logging through a queue drained by a background thread
+
+    Application threads only enqueue records; formatting and the console and
+    file writes happen on the listener thread. When the queue is full, records
+    are dropped rather than blocking the caller. `settings` is the `logging`
+    config section: level, format ("text" or "json"), file (overrides
+    `log_file`), max_bytes and backup_count for size-based rotation,
+    queue_size, and diagnostics sampling. Loggers named in `reroute` that
+    have their own handlers (e.g. uvicorn's) are moved onto the queue too.
+    """
+    global _queue_handler, _handlers, _fork_hook_registered
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    stop_logging()
+
+    formatter = JsonFormatter() if settings["format"] == "json" else StructuredFormatter(DEFAULT_FORMAT)
+    _handlers = []
+    if console:
+        _handlers.append(logging.StreamHandler())
+    path = settings.get("file", log_file)
+    if path:
+        _handlers.append(logging.handlers.RotatingFileHandler(
+            path, maxBytes=settings["max_bytes"], backupCount=settings["backup_count"],
+            encoding="utf-8", delay=True))
+    for handler in _handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = DroppingQueueHandler(None)
+    _start_listener(settings["queue_size"])
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(getattr(logging, str(settings["level"]).upper(), logging.INFO))
+    for name in reroute:
+        rerouted = logging.getLogger(name)
+        if rerouted.handlers:
+            rerouted.handlers = [_queue_handler]
+
+    _diagnostics_settings.update(settings.get("diagnostics") or {})
+    for sampled in _sampled.values():
+        sampled.configure(**_diagnostics_settings)
+
+    if not _fork_hook_registered:
+        atexit.register(stop_logging)
+        os.register_at_fork(after_in_child=_restart_in_child)
+        _fork_hook_registered = True
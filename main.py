@@ -1,3 +1,4 @@
+import argparse
 import cv2
 import numpy as np
 import random
@@ -6,20 +7,27 @@ import threading
 import subprocess
 import os
 import logging
+import uuid
 import json
 from pathlib import Path
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('doomscroll_blocker.log'),
-        logging.StreamHandler()
-    ]
-)
+from detection import CHIN, EYES, NOSE_TIP, FaceTracker, MotionGate, load_thresholds, log_diagnostics
+from analytics import AnalyticsStore
+from backends import select_backend
+from camera import CameraConnector
+from logging_setup import setup_logging
+from overlay import OverlayRenderer
+from pipeline import CaptureThread, DetectionWorker, StageStats
+from rickroll_player import RickrollPlayer
+
 logger = logging.getLogger(__name__)
 
+# How often the pipeline logs per-stage FPS/latency
+STATS_INTERVAL_SECONDS = 10
+
+# Window used when rickroll.display is "window"
+RICKROLL_WINDOW = 'Never Gonna Give You Up'
+
 class DoomscrollDetector:
     def __init__(self, config_path='config.json'):
         """Initialize detector with configuration"""
@@ -27,24 +35,21 @@ class DoomscrollDetector:
         self.config = self.load_config(config_path)
         logger.info("Initializing Doomscrolling Blocker...")
         
-        # face landmark detection
-        try:
-            import dlib
-            self.use_dlib = True
-            self.detector = dlib.get_frontal_face_detector()
-            # Download from: http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
-            self.predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
-            logger.info("Using dlib for face tracking")
-        except Exception as e:
-            # Fallback to OpenCV Haar Cascades
-            self.use_dlib = False
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
-            self.eye_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_eye.xml'
-            )
-            logger.info(f"Using OpenCV Haar Cascades for face tracking (dlib unavailable: {e})")
+        # Face search runs on a frame shrunk by this factor; landmarks/eyes use full resolution
+        self.detection_scale = self.config['detection'].get('scale', 1.0)
+        self.thresholds = load_thresholds(self.config)
+        # dlib or a Haar cascade, configured or picked by startup calibration
+        self.backend, self.calibration = select_backend(self.config)
+        self.use_dlib = self.backend.kind == "dlib"
+        if not self.use_dlib:
+            self.face_tracker = FaceTracker.from_config(self.config)
+
+        # Reuse the last result while the picture is (nearly) unchanged
+        self.motion_gate = MotionGate.from_config(self.config)
+
+        # Landmark/face debug markers are only built and drawn when enabled
+        self.debug_markers = self.config.get('display', {}).get('debug_markers', False)
+        self.overlay = OverlayRenderer()
 
         # Roasting messages from config
         self.roasts = self.config['roasting']['messages']
@@ -54,12 +59,23 @@ class DoomscrollDetector:
         self.current_roast = ""
         self.prev_eye_ratio = 0.5
 
-        # Rickroll video
+        # Webcam (re)connection: last good device first, parallel probing otherwise
+        self.camera = CameraConnector(self.config['camera'])
+
+        # Rickroll video: decoded in-process into the window (or a second one), external player when headless
         self.rickroll_path = self.config['rickroll']['video_path']
-        self.rickroll_enabled = self.config['rickroll']['enabled']
+        self.rickroll_enabled = self.config['rickroll']['enabled'] and os.path.exists(self.rickroll_path)
+        if self.config['rickroll']['enabled'] and not self.rickroll_enabled:
+            logger.warning(f"Rickroll video not found: {self.rickroll_path}")
+        self.rickroll_display = self.config['rickroll'].get('display', 'inset')
+        self.rickroll_player = None
         self.rickroll_process = None
         self.is_rickrolling = False
 
+        # Detection history, recorded once run() starts
+        self.analytics = AnalyticsStore.from_config(self.config)
+        self.session_id = f"desktop-{uuid.uuid4().hex[:12]}"
+
         # Detection state tracking for stability
         self.doomscroll_count = 0
         self.normal_count = 0
@@ -87,12 +103,54 @@ class DoomscrollDetector:
             "camera": {
                 "preferred_index": 0,
                 "warmup_seconds": 2.0,
-                "retry_delay_seconds": 5
+                "retry_delay_seconds": 5,
+                "initial_retry_delay_seconds": 0.25,
+                "warmup_tolerance": 2.0,
+                "width": 640,
+                "height": 480,
+                "fps": 15,
+                "fourcc": "MJPG",
+                "buffer_size": 1
             },
             "detection": {
                 "threshold_frames": 1,
+                "scale": 1.0,
+                "max_fps": 0,
                 "face_position_ratio": 0.58,
-                "eye_position_ratio": 0.6
+                "face_position_ratio_low": 0.52,
+                "face_aspect_ratio": 1.1,
+                "eye_position_ratio": 0.6,
+                "eye_position_ratio_low": 0.52,
+                "score_threshold": 3,
+                "head_tilt": 1.3,
+                "eye_ratio": 0.35,
+                "tracking": {
+                    "enabled": True,
+                    "full_search_interval": 10,
+                    "padding": 0.5,
+                    "size_tolerance": 0.3,
+                    "roi_scale_factor": 1.1
+                },
+                "motion_gate": {
+                    "enabled": True,
+                    "threshold": 2.0,
+                    "thumbnail_size": 32,
+                    "max_reuse": 15
+                }
+            },
+            "backends": {
+                "backend": "auto",
+                "calibrate": False,
+                "latency_budget_ms": 40,
+                "min_face_rate": 0.6,
+                "sample_clip": "rickroll.mp4",
+                "sample_frames": 15,
+                "sample_width": 480,
+                "haar_params": [
+                    {"scale_factor": 1.3, "min_neighbors": 5},
+                    {"scale_factor": 1.2, "min_neighbors": 5},
+                    {"scale_factor": 1.1, "min_neighbors": 5}
+                ]
             },
             "roasting": {
                 "cooldown_seconds": 3,
@@ -104,161 +162,188 @@ class DoomscrollDetector:
             },
             "rickroll": {
                 "video_path": "rickroll.mp4",
-                "enabled": True
+                "enabled": True,
+                "display": "inset",
+                "height": 240,
+                "buffer_frames": 32
+            },
+            "display": {
+                "debug_markers": False
+            },
+            "headless": {
+                "detection_fps": 2
+            },
+            "analytics": {
+                "enabled": True,
+                "path": "doomscroll_stats.db",
+                "flush_interval_seconds": 1.0,
+                "batch_size": 500,
+                "max_gap_seconds": 10
+            },
+            "logging": {
+                "level": "INFO",
+                "format": "text",
+                "max_bytes": 5242880,
+                "backup_count": 3,
+                "queue_size": 10000,
+                "diagnostics": {
+                    "sample_rate": 0.1,
+                    "max_per_second": 5
+                }
             }
         }
 
-    def detect_doomscroll_dlib(self, frame, gray):
-        """Detect doomscrolling using dlib landmarks"""
-        faces = self.detector(gray)
-
-        for face in faces:
-            landmarks = self.predictor(gray, face)
-
-            # Get key points
-            nose_tip = (landmarks.part(30).x, landmarks.part(30).y)
-            chin = (landmarks.part(8).x, landmarks.part(8).y)
-            forehead_approx = (landmarks.part(27).x, landmarks.part(27).y)
-
-            # Left eye points (36-41) // I PLAYED AROUND WITH THESE NUMBERS IDK
-            left_eye_points = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(36, 42)]
-            # Right eye points (42-47)
-            right_eye_points = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(42, 48)]
-
-            # Calculate eye aspect ratio (detect if looking down)
-            left_eye_top = (left_eye_points[1][1] + left_eye_points[2][1]) / 2
-            left_eye_bottom = (left_eye_points[4][1] + left_eye_points[5][1]) / 2
-            left_eye_center = (left_eye_points[0][1] + left_eye_points[3][1]) / 2
-
-            right_eye_top = (right_eye_points[1][1] + right_eye_points[2][1]) / 2
-            right_eye_bottom = (right_eye_points[4][1] + right_eye_points[5][1]) / 2
-            right_eye_center = (right_eye_points[0][1] + right_eye_points[3][1]) / 2
-
-            # Vertical eye position ratio
-            left_ratio = abs(left_eye_center - left_eye_top) / (abs(left_eye_bottom - left_eye_top) + 1e-6)
-            right_ratio = abs(right_eye_center - right_eye_top) / (abs(right_eye_bottom - right_eye_top) + 1e-6)
-            eye_ratio = (left_ratio + right_ratio) / 2
-
-            # Head tilt detection
-            head_tilt = (chin[1] - nose_tip[1]) / (nose_tip[1] - forehead_approx[1] + 1e-6)
-
-            # Looking down if head tilted forward or eyes positioned low
-            is_looking_down = head_tilt > 1.3 or eye_ratio < 0.35
-
-            # Draw debug points
-            cv2.circle(frame, nose_tip, 3, (0, 255, 0), -1)
-            cv2.circle(frame, chin, 3, (255, 0, 0), -1)
-            for pt in left_eye_points + right_eye_points:
-                cv2.circle(frame, pt, 2, (0, 255, 255), -1)
-
-            return is_looking_down
-
-        return False
-
-    def detect_doomscroll_opencv(self, frame, gray):
-        """Detect doomscrolling using OpenCV Haar Cascades with improved accuracy"""
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        for (x, y, w, h) in faces:
-            # Draw face rectangle
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-
-            # Region of interest for eyes
-            roi_gray = gray[y:y+int(h*0.6), x:x+w]
-            roi_color = frame[y:y+int(h*0.6), x:x+w]
-
-            eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 5)
-
-            # Multiple detection criteria for better accuracy
-            detection_score = 0
-
-            # 1. Calculate face position - if face is in lower half = looking down
-            face_center_y = y + h//2
-            frame_height = frame.shape[0]
-            face_position_ratio = face_center_y / frame_height
-
-            if face_position_ratio > 0.58:
-                detection_score += 2
-            elif face_position_ratio > 0.52:
-                detection_score += 1
-
-            # 2. Check face aspect ratio (looking down = face appears shorter/wider)
-            aspect_ratio = h / w
-            if aspect_ratio < 1.1:  # Face appears wider than normal
-                detection_score += 1
-
-            # 3. Also check eye positions
+    def detect_doomscroll_dlib(self, gray, timings=None):
+        """Detect doomscrolling using dlib landmarks; returns (is_looking_down, debug markers if enabled)"""
+        analysis = self.backend.analyze(gray, self.thresholds, self.detection_scale, timings=timings)
+        log_diagnostics(self.backend.label, analysis)
+
+        looking_down = bool(analysis["looking_down"].any())
+        if not self.debug_markers:
+            return looking_down, []
+
+        # Debug points, drawn later by the render loop: nose tip, chin, eye contours
+        markers = []
+        for points in analysis["landmarks"]:
+            points = points.tolist()
+            markers.append(("circle", tuple(points[NOSE_TIP]), 3, (0, 255, 0)))
+            markers.append(("circle", tuple(points[CHIN]), 3, (255, 0, 0)))
+            for pt in points[EYES]:
+                markers.append(("circle", tuple(pt), 2, (0, 255, 255)))
+
+        return looking_down, markers
+
+    def detect_doomscroll_opencv(self, gray, timings=None):
+        """Detect doomscrolling using OpenCV Haar Cascades; returns (is_looking_down, debug markers if enabled)"""
+        analysis = self.backend.analyze(gray, self.thresholds, self.detection_scale, self.face_tracker, timings)
+        log_diagnostics(self.backend.label, analysis)
+
+        looking_down = bool(analysis["looking_down"].any())
+        if not self.debug_markers:
+            return looking_down, []
+
+        # Face rectangles, plus eye rectangles when both eyes were found
+        markers = []
+        for (x, y, w, h), eyes in zip(analysis["faces"].tolist(), analysis["eyes"]):
+            markers.append(("rect", (x, y), (x+w, y+h), (255, 0, 0)))
             if len(eyes) >= 2:
-                eye_y_positions = [y + ey + eh//2 for (ex, ey, ew, eh) in eyes]
-                avg_eye_y = sum(eye_y_positions) / len(eye_y_positions)
-                eye_position_in_face = (avg_eye_y - y) / h
-
-                # If eyes are in lower part of detected face region = looking down
-                if eye_position_in_face > 0.6:
-                    detection_score += 2
-                elif eye_position_in_face > 0.52:
-                    detection_score += 1
-
-                # Draw eye rectangles
-                for (ex, ey, ew, eh) in eyes:
-                    cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
-            elif len(eyes) < 2:
-                # If we can't detect eyes well, might be looking down
-                detection_score += 1
-
-            # Decision: doomscrolling if score >= 3
-            is_looking_down = detection_score >= 3
-
-            return is_looking_down
-
-        return False
+                for (ex, ey, ew, eh) in eyes.tolist():
+                    markers.append(("rect", (ex, ey), (ex+ew, ey+eh), (0, 255, 0)))
+
+        return looking_down, markers
+
+    @staticmethod
+    def draw_markers(frame, markers):
+        """Draw debug markers returned by the detect functions"""
+        for marker in markers:
+            if marker[0] == "circle":
+                _, center, radius, color = marker
+                cv2.circle(frame, center, radius, color, -1)
+            else:
+                _, pt1, pt2, color = marker
+                cv2.rectangle(frame, pt1, pt2, color, 2)
+
+    def analyze(self, frame, timings=None):
+        """Detection stage: raw camera frame -> (stabilized state, debug markers)
+
+        Works in mirrored coordinates to match the displayed frame. Runs on
+        the detection thread and never writes to `frame`. Per-stage seconds
+        go into `timings` when given. Frames the motion gate considers
+        unchanged reuse the previous raw detection.
+        """
+        reused = self.motion_gate.check(frame)
+        if reused is not None:
+            raw_detection, markers = reused
+        else:
+            start = time.perf_counter()
+            gray = cv2.flip(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1)
+            if timings is not None:
+                timings["color"] = time.perf_counter() - start
+
+            if self.use_dlib:
+                raw_detection, markers = self.detect_doomscroll_dlib(gray, timings)
+            else:
+                raw_detection, markers = self.detect_doomscroll_opencv(gray, timings)
+            self.motion_gate.store((raw_detection, markers))
+
+        # Stabilize detection with frame counting to avoid flickering
+        if raw_detection:
+            self.doomscroll_count += 1
+            self.normal_count = 0
+        else:
+            self.normal_count += 1
+            self.doomscroll_count = 0
+
+        # Only trigger if we've detected consistently for threshold frames
+        if self.doomscroll_count >= self.detection_threshold:
+            state = "doomscrolling"
+        elif self.normal_count >= self.detection_threshold:
+            state = "normal"
+        else:
+            state = "monitoring"
+        self.analytics.record("desktop", self.session_id, state == "doomscrolling")
+        return state, markers
+
+    def open_rickroll_player(self):
+        """In-process player that starts prefetching right away; None if disabled or undecodable"""
+        if not self.rickroll_enabled or self.rickroll_display not in ('inset', 'window'):
+            return None
+        try:
+            return RickrollPlayer(self.rickroll_path, self.config['rickroll'].get('height', 240),
+                                  self.config['rickroll'].get('buffer_frames', 32))
+        except RuntimeError as e:
+            logger.error(f"Rickroll playback unavailable: {e}")
+            return None
 
     def play_rickroll(self):
-        """Play rickroll video with autoplay (only if not already playing)"""
-        if not self.rickroll_enabled:
+        """Play (or resume) the rickroll, only if not already playing"""
+        if not self.rickroll_enabled or self.is_rickrolling:
             return
-            
-        if not self.is_rickrolling and os.path.exists(self.rickroll_path):
-            self.is_rickrolling = True
-            logger.info("Playing rickroll...")
-            
-            # Use system default video player with autoplay in background thread
-            def start_video():
-                try:
-                    if os.name == 'posix':  # macOS/Linux
-                        if os.uname().sysname == 'Darwin':  # macOS
-                            # Use afplay for audio or osascript to force QuickTime to play
+        self.is_rickrolling = True
+        logger.info("Playing rickroll...")
+        if self.rickroll_player is not None:
+            self.rickroll_player.play()
+            return
+
+        # Headless: hand off to the system video player in a background thread
+        def start_video():
+            try:
+                if os.name == 'posix':  # macOS/Linux
+                    if os.uname().sysname == 'Darwin':  # macOS
+                        # Use afplay for audio or osascript to force QuickTime to play
+                        self.rickroll_process = subprocess.Popen(
+                            ['osascript', '-e', f'tell application "QuickTime Player" to open POSIX file "{os.path.abspath(self.rickroll_path)}"',
+                             '-e', 'tell application "QuickTime Player" to play front document'],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL
+                        )
+                    else:  # Linux
+                        # Try vlc first because of autoplay, fallback to xdg-open
+                        try:
                             self.rickroll_process = subprocess.Popen(
-                                ['osascript', '-e', f'tell application "QuickTime Player" to open POSIX file "{os.path.abspath(self.rickroll_path)}"',
-                                 '-e', 'tell application "QuickTime Player" to play front document'],
+                                ['vlc', '--play-and-exit', self.rickroll_path],
                                 stdout=subprocess.DEVNULL,
                                 stderr=subprocess.DEVNULL
                             )
-                        else:  # Linux
-                            # Try vlc first because of autoplay, fallback to xdg-open
-                            try:
-                                self.rickroll_process = subprocess.Popen(
-                                    ['vlc', '--play-and-exit', self.rickroll_path],
-                                    stdout=subprocess.DEVNULL,
-                                    stderr=subprocess.DEVNULL
-                                )
-                            except:
-                                self.rickroll_process = subprocess.Popen(['xdg-open', self.rickroll_path])
-                    else:  # Windows
-                        os.startfile(self.rickroll_path)
-                except Exception as e:
-                    logger.error(f"Failed to play rickroll: {e}")
+                        except:
+                            self.rickroll_process = subprocess.Popen(['xdg-open', self.rickroll_path])
+                else:  # Windows
+                    os.startfile(self.rickroll_path)
+            except Exception as e:
+                logger.error(f"Failed to play rickroll: {e}")
 
-            # Start video in background thread to avoid blocking
-            video_thread = threading.Thread(target=start_video, daemon=True)
-            video_thread.start()
-        elif not os.path.exists(self.rickroll_path):
-            logger.warning(f"Rickroll video not found: {self.rickroll_path}")
+        # Start video in background thread to avoid blocking
+        video_thread = threading.Thread(target=start_video, daemon=True)
+        video_thread.start()
 
     def stop_rickroll(self):
-        """Stop rickroll video"""
+        """Pause the in-process rickroll where it is, or stop the external player"""
         if self.is_rickrolling:
             self.is_rickrolling = False
+            if self.rickroll_player is not None:
+                self.rickroll_player.pause()
+                if self.rickroll_display == 'window':
+                    cv2.destroyWindow(RICKROLL_WINDOW)
             if self.rickroll_process:
                 try:
                     # Kill the video player process
@@ -269,141 +354,218 @@ class DoomscrollDetector:
                     pass
                 self.rickroll_process = None
 
-    def show_roast(self, frame):
-        """Display roasting message on frame"""
-        current_time = time.time()
+    def show_rickroll(self, frame):
+        """Current rickroll frame, inset into the camera frame or in its own window"""
+        clip = self.rickroll_player.frame()
+        if clip is None:
+            return
+        if self.rickroll_display == 'window':
+            cv2.imshow(RICKROLL_WINDOW, clip)
+        else:
+            self.overlay.inset(frame, clip)
 
+    def next_roast(self):
+        """Pick a new roast once the cooldown has passed; returns True when it changed"""
+        current_time = time.time()
         if current_time - self.last_roast_time > self.roast_cooldown:
             self.current_roast = random.choice(self.roasts)
             self.last_roast_time = current_time
+            return True
+        return False
 
-        # Create semi-transparent overlay
-        overlay = frame.copy()
-        h, w = frame.shape[:2]
+    def show_roast(self, frame):
+        """Display roasting message on frame"""
+        self.next_roast()
 
-        # Draw red warning background
-        cv2.rectangle(overlay, (0, 0), (w, 150), (0, 0, 255), -1)
-        cv2.addWeighted(overlay, 0.4, frame, 0.6, 0, frame)
+        # Red band with warning and roast, blended in place from cached sprites
+        self.overlay.banner(frame, self.current_roast)
 
-        # Draw warning text
-        cv2.putText(frame, "DOOMSCROLLING DETECTED!", (w//2 - 250, 50),
-                   cv2.FONT_HERSHEY_DUPLEX, 1.0, (255, 255, 255), 3)
+    def init_camera(self):
+        """Open the last working camera, or probe all candidates in parallel; None if none delivers frames"""
+        return self.camera.connect()
 
-        # Draw roast message
-        cv2.putText(frame, self.current_roast, (w//2 - 300, 100),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    def run(self, headless=False):
+        """Main loop: (re)open the camera, then run the GUI pipeline or the headless loop on it"""
+        logger.info("Doomscrolling Blocker Started!")
+        logger.info("Running headless, press Ctrl+C to quit" if headless else "Press 'q' to quit")
 
-    def init_camera(self):
-        """Robust camera initialization"""
-        warmup_time = self.config['camera']['warmup_seconds']
-        
-        # Try indices 0 and 1
-        for index in [0, 1]:
-            logger.info(f"Attempting to open camera index {index}...")
-            try:
-                cap = cv2.VideoCapture(index)
-                if not cap.isOpened():
-                    logger.warning(f"Failed to open camera index {index}")
+        self.analytics.start()
+        if not headless:
+            self.rickroll_player = self.open_rickroll_player()
+        try:
+            while True:
+                cap = self.init_camera()
+
+                if cap is None:
+                    retry_delay = self.camera.next_retry_delay()
+                    logger.error(f"Could not open any webcam. Retrying in {retry_delay:.2f} seconds...")
+                    time.sleep(retry_delay)
                     continue
 
-                # Warmup
-                logger.info(f"Camera index {index} opened, warming up for {warmup_time}s...")
-                time.sleep(warmup_time)
-                
-                # Verify we can actually get a frame
-                ret, frame = cap.read()
-                if ret and frame is not None and frame.size > 0:
-                    logger.info(f"Successfully initialized camera {index}")
-                    return cap
-                
-                logger.warning(f"Failed to grab frame from camera {index}")
-                cap.release()
-            except Exception as e:
-                logger.error(f"Error initializing camera {index}: {e}")
-                
-        return None
+                logger.info("Camera started. Looking for your face...")
 
-    def run(self):
-        """Main loop"""
-        logger.info("Doomscrolling Blocker Started!")
-        logger.info("Press 'q' to quit")
+                try:
+                    if self.headless_loop(cap) if headless else self.gui_session(cap):
+                        return
+                except Exception as e:
+                    logger.error(f"Error in main loop: {e}")
+                finally:
+                    cap.release()
+
+                # Camera stopped delivering frames (disconnect): reconnect right away, backing off only on failure
+                logger.warning("Camera disconnected/closed. Reconnecting...")
+        finally:
+            if self.rickroll_player is not None:
+                self.rickroll_player.close()
+                self.rickroll_player = None
+            self.analytics.stop()
+
+    def gui_session(self, cap):
+        """Capture and detection run on their own threads, this thread renders; True when the user quits"""
+        max_fps = self.config['detection'].get('max_fps', 0)
+        capture = CaptureThread(cap)
+        detection = DetectionWorker(capture.frames, self.analyze, 1.0 / max_fps if max_fps else 0.0)
+        capture.start()
+        detection.start()
+        try:
+            return self.render_loop(capture, detection)
+        finally:
+            capture.stop()
+            detection.stop()
+            capture.join(timeout=1)
+            detection.join(timeout=1)
+
+    def headless_loop(self, cap):
+        """Low-power loop without a window: wake up `headless.detection_fps` times a second
+
+        Each wake-up drops the frames the driver queued while we slept and
+        analyzes only the newest one, so the camera is never read at full
+        rate. Returns True on Ctrl+C, False when the camera stops delivering.
+        """
+        interval = 1.0 / self.config.get('headless', {}).get('detection_fps', 2)
+        stale_frames = self.config['camera'].get('buffer_size', 1)
+        detect_stats = StageStats("detect")
+        failures = 0
+        last_report = next_run = time.monotonic()
 
-        retry_delay = self.config['camera']['retry_delay_seconds']
+        try:
+            while cap.isOpened():
+                # grab() dequeues without decoding
+                for _ in range(stale_frames):
+                    cap.grab()
+                success, frame = cap.read()
+                if not success:
+                    failures += 1
+                    if failures >= 50:
+                        logger.warning("Failed to grab frames - camera lost")
+                        return False
+                    time.sleep(0.1)
+                    continue
+                failures = 0
+
+                start = time.monotonic()
+                state, _ = self.analyze(frame)
+                detect_stats.record(time.monotonic() - start)
+
+                if state == "doomscrolling":
+                    if self.next_roast():
+                        logger.warning(f"DOOMSCROLLING DETECTED! {self.current_roast}")
+                    self.play_rickroll()
+                elif state == "normal":
+                    self.stop_rickroll()
+
+                if start - last_report >= STATS_INTERVAL_SECONDS:
+                    last_report = start
+                    logger.info(f"Headless: {detect_stats.summary()} | {self.motion_gate.summary()}")
+
+                # Fixed wake-up rate; if detection overran, start the next one right away
+                now = time.monotonic()
+                next_run = max(next_run + interval, now)
+                time.sleep(next_run - now)
+        except KeyboardInterrupt:
+            logger.info("User requested quit")
+            self.stop_rickroll()
+            return True
 
-        while True:
-            cap = self.init_camera()
+        return False
 
-            if cap is None:
-                logger.error(f"Could not open any webcam. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+    def render_loop(self, capture, detection):
+        """Draw every captured frame with the latest known detection result
+
+        Runs at camera rate regardless of detection latency. Returns True
+        when the user quits, False when the capture thread stops.
+        """
+        render_stats = StageStats("render")
+        last_report = time.monotonic()
+        frame_seq = 0
+        state, markers = "monitoring", []
+        frame = None
+
+        while capture.is_alive():
+            frame_seq, item = capture.frames.get(frame_seq, timeout=0.1)
+            if item is None:
                 continue
 
-            logger.info("Camera started. Looking for your face...")
-            
-            try:
-                while cap.isOpened():
-                    success, frame = cap.read()
-                    if not success:
-                        logger.warning("Failed to grab frame - Retrying...")
-                        time.sleep(0.1)
-                        continue
-
-                    # Flip frame horizontally for mirror view
-                    frame = cv2.flip(frame, 1)
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-                    # Detect doomscrolling
-                    if self.use_dlib:
-                        raw_detection = self.detect_doomscroll_dlib(frame, gray)
-                    else:
-                        raw_detection = self.detect_doomscroll_opencv(frame, gray)
-
-                    # Stabilize detection with frame counting to avoid flickering
-                    if raw_detection:
-                        self.doomscroll_count += 1
-                        self.normal_count = 0
-                    else:
-                        self.normal_count += 1
-                        self.doomscroll_count = 0
-
-                    # Only trigger if we've detected consistently for threshold frames
-                    is_doomscrolling = self.doomscroll_count >= self.detection_threshold
-                    is_normal = self.normal_count >= self.detection_threshold
-
-                    if is_doomscrolling:
-                        self.show_roast(frame)
-                        # Play rickroll when doomscrolling
-                        self.play_rickroll()
-                    elif is_normal:
-                        # Show encouraging message
-                        cv2.putText(frame, "Good posture! Keep it up!", (10, 30),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        # Stop rickroll when back to normal
-                        self.stop_rickroll()
-                    else:
-                        # Transitioning state - show neutral message
-                        cv2.putText(frame, "Monitoring...", (10, 30),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-
-                    # Display frame
-                    cv2.imshow('Doomscrolling Blocker', frame)
-
-                    # Exit on 'q'
-                    if cv2.waitKey(5) & 0xFF == ord('q'):
-                        logger.info("User requested quit")
-                        self.stop_rickroll()
-                        cap.release()
-                        cv2.destroyAllWindows()
-                        return
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                
-            # If inner loop breaks (camera disconnect), release and retry
-            cap.release()
-            logger.warning("Camera disconnected/closed. Restarting...")
-            time.sleep(1)
+            start = time.monotonic()
+            # Flip horizontally for mirror view into a reused buffer; the detector keeps reading the original
+            if frame is None or frame.shape != item[0].shape:
+                frame = np.empty_like(item[0])
+            cv2.flip(item[0], 1, dst=frame)
+
+            _, result = detection.results.peek()
+            if result is not None:
+                (state, markers), _ = result
+            self.draw_markers(frame, markers)
+
+            if state == "doomscrolling":
+                self.show_roast(frame)
+                # Play rickroll when doomscrolling
+                self.play_rickroll()
+            elif state == "normal":
+                # Show encouraging message
+                self.overlay.label(frame, "Good posture! Keep it up!", (0, 255, 0))
+                # Stop rickroll when back to normal
+                self.stop_rickroll()
+            else:
+                # Transitioning state - show neutral message
+                self.overlay.label(frame, "Monitoring...", (255, 255, 0))
+
+            if self.is_rickrolling and self.rickroll_player is not None:
+                self.show_rickroll(frame)
+
+            # Display frame
+            cv2.imshow('Doomscrolling Blocker', frame)
+            render_stats.record(time.monotonic() - start)
+
+            if start - last_report >= STATS_INTERVAL_SECONDS:
+                last_report = start
+                stages = [capture.stats, detection.stats, render_stats, detection.lag_stats, self.motion_gate]
+                logger.info("Pipeline: " + " | ".join(stage.summary() for stage in stages))
+
+            # Exit on 'q'
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                logger.info("User requested quit")
+                self.stop_rickroll()
+                cv2.destroyAllWindows()
+                return True
+
+        return False
 
 
 if __name__ == '__main__':
-    detector = DoomscrollDetector()
-    detector.run()
+    parser = argparse.ArgumentParser(description="Doomscrolling Blocker (desktop)")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window or drawing; detect at headless.detection_fps to save power")
+    args = parser.parse_args()
+
+    # Logging is set up before the detector so its startup messages go through the same handlers
+    try:
+        with open(args.config) as f:
+            logging_settings = json.load(f).get('logging')
+    except (OSError, json.JSONDecodeError):
+        logging_settings = None
+    setup_logging(logging_settings, log_file='doomscroll_blocker.log')
+
+    detector = DoomscrollDetector(args.config)
+    detector.run(headless=args.headless)
@@ -0,0 +1,290 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import cv2
+
+from analytics import AnalyticsStore
+from backends import select_backend
+from camera import CameraConnector
+from detection import FaceTracker, MotionGate, load_thresholds, log_diagnostics
+from logging_setup import setup_logging
+from pipeline import CaptureThread, StageStats
+
+logger = logging.getLogger(__name__)
+
+# How often per-stream FPS/latency and pool usage are logged
+STATS_INTERVAL_SECONDS = 10
+
+# Longest a worker sleeps before rechecking the streams when no frame wakes it up
+IDLE_WAIT_SECONDS = 0.1
+
+
+class CameraStream(CaptureThread):
+    """One camera of a multi-camera setup: its capture thread plus its own detection state
+
+    The thread reopens the camera after a disconnect (the device only, no
+    fallback indices), backing off like the desktop app. `source` is a
+    device index or anything else cv2.VideoCapture opens (a file, an RTSP URL).
+    Only the scheduler thread currently analyzing the stream touches its
+    tracker, motion gate and counters.
+    """
+
+    def __init__(self, name, source, camera_config, config, tracker=None, on_frame=None):
+        super().__init__(None, name=f"capture-{name}", on_frame=on_frame)
+        self.stream_name = name
+        self.connector = CameraConnector({**camera_config, 'preferred_index': source, 'fallback_indices': []})
+        self.tracker = tracker
+        self.motion_gate = MotionGate.from_config(config)
+        self.detection_threshold = config['detection']['threshold_frames']
+        self.doomscroll_count = 0
+        self.normal_count = 0
+        self.state = "monitoring"
+
+        # Scheduler bookkeeping, guarded by the scheduler's lock
+        self.last_seq = 0
+        self.next_due = 0.0
+        self.detect_stats = StageStats("detect")
+        self.lag_stats = StageStats("capture-to-result")
+
+    def run(self):
+        while not self._stop_event.is_set():
+            cap = self.connector.connect()
+            if cap is None:
+                retry_delay = self.connector.next_retry_delay()
+                logger.error(f"[{self.stream_name}] Could not open the camera. Retrying in {retry_delay:.2f} seconds...")
+                self._stop_event.wait(retry_delay)
+                continue
+
+            logger.info(f"[{self.stream_name}] Camera started")
+            self.cap = cap
+            try:
+                super().run()
+            finally:
+                cap.release()
+            if not self._stop_event.is_set():
+                logger.warning(f"[{self.stream_name}] Camera disconnected/closed. Reconnecting...")
+
+    def update(self, raw_detection):
+        """Stabilize a raw detection like the desktop app does; returns the previous state"""
+        if raw_detection:
+            self.doomscroll_count += 1
+            self.normal_count = 0
+        else:
+            self.normal_count += 1
+            self.doomscroll_count = 0
+
+        previous = self.state
+        if self.doomscroll_count >= self.detection_threshold:
+            self.state = "doomscrolling"
+        elif self.normal_count >= self.detection_threshold:
+            self.state = "normal"
+        else:
+            self.state = "monitoring"
+        return previous
+
+    def summary(self):
+        return f"[{self.stream_name}] {self.state} | " + " | ".join(
+            stage.summary() for stage in (self.stats, self.detect_stats, self.lag_stats, self.motion_gate))
+
+
+class StreamScheduler:
+    """A fixed pool of detection threads shared by every stream, served round-robin
+
+    A stream is ready when it has a frame newer than the last one analyzed,
+    no worker is analyzing it already and its `min_interval` has passed.
+    A free worker takes the next ready stream after the one served last, so
+    a camera with a fast frame rate can't starve the others. Only each
+    stream's newest frame is ever analyzed: nothing queues up, whatever the
+    number of streams or workers.
+
+    `analyze(stream, backend, frame)` runs on the worker; each worker owns a
+    copy of the backend (cascades must not be shared between concurrent calls).
+    """
+
+    def __init__(self, streams, backend, analyze, workers, min_interval=0.0):
+        self.streams = streams
+        self.backend = backend
+        self.analyze = analyze
+        self.workers = max(1, min(workers, len(streams)))
+        self.min_interval = min_interval
+        self.busy_seconds = 0.0
+        self._cond = threading.Condition()
+        self._cursor = 0
+        self._busy = set()
+        self._threads = []
+        self._stopped = False
+
+    def notify(self):
+        """Wake one idle worker; streams call this for every captured frame"""
+        with self._cond:
+            self._cond.notify()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"detect-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def _next(self):
+        """Claim the next ready stream in round-robin order; returns (index, item, None) or (None, None, seconds to wait)"""
+        now = time.monotonic()
+        wait = IDLE_WAIT_SECONDS
+        for offset in range(len(self.streams)):
+            i = (self._cursor + offset) % len(self.streams)
+            stream = self.streams[i]
+            if i in self._busy:
+                continue
+            seq, item = stream.frames.peek()
+            if item is None or seq == stream.last_seq:
+                continue
+            if now < stream.next_due:
+                wait = min(wait, stream.next_due - now)
+                continue
+            self._cursor = i + 1
+            self._busy.add(i)
+            stream.last_seq = seq
+            return i, item, None
+        return None, None, wait
+
+    def _work(self):
+        backend = self.backend.for_thread()
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    i, item, wait = self._next()
+                    if i is not None:
+                        break
+                    self._cond.wait(wait)
+
+            stream = self.streams[i]
+            frame, captured_at = item
+            start = time.monotonic()
+            try:
+                self.analyze(stream, backend, frame)
+            except Exception as e:
+                logger.error(f"[{stream.stream_name}] Detection failed: {e}")
+            done = time.monotonic()
+            stream.detect_stats.record(done - start)
+            stream.lag_stats.record(done - captured_at)
+
+            with self._cond:
+                self._busy.discard(i)
+                stream.next_due = start + self.min_interval
+                self.busy_seconds += done - start
+                # The stream may already have a newer frame waiting
+                self._cond.notify()
+
+
+class MultiCamMonitor:
+    """Watches several cameras in one process, e.g. a shared study room
+
+    Every camera listed in `multicam.cameras` gets a CameraStream; detection
+    for all of them runs on one StreamScheduler pool of `multicam.workers`
+    threads (default: one per CPU core). OpenCV releases the GIL while it
+    detects, so with its own threading limited to `opencv_threads` per call
+    the pool keeps that many cores busy without oversubscribing them.
+    Headless: state changes are logged and recorded per camera.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        settings = config.get('multicam', {})
+        cameras = settings.get('cameras', [])
+        if not cameras:
+            raise ValueError("No cameras configured in multicam.cameras")
+
+        self.detection_scale = config['detection'].get('scale', 1.0)
+        self.thresholds = load_thresholds(config)
+        self.backend, _ = select_backend(config)
+        if settings.get('opencv_threads'):
+            cv2.setNumThreads(settings['opencv_threads'])
+
+        self.analytics = AnalyticsStore.from_config(config)
+        workers = settings.get('workers') or os.cpu_count() or 1
+        max_fps = settings.get('max_fps', 0)
+        self.streams = []
+        for i, camera in enumerate(cameras):
+            # Any `camera` setting can be overridden per camera
+            camera_config = {**config['camera'], **{k: v for k, v in camera.items() if k not in ('name', 'index')}}
+            tracker = FaceTracker.from_config(config) if self.backend.kind == "haar" else None
+            self.streams.append(CameraStream(camera.get('name', f"camera-{i}"), camera.get('index', i),
+                                             camera_config, config, tracker))
+        self.scheduler = StreamScheduler(self.streams, self.backend, self.analyze, workers,
+                                         1.0 / max_fps if max_fps else 0.0)
+        for stream in self.streams:
+            stream.on_frame = self.scheduler.notify
+        logger.info(f"Monitoring {len(self.streams)} cameras with {self.scheduler.workers} detection workers "
+                    f"({self.backend.label})")
+
+    def analyze(self, stream, backend, frame):
+        """Detection for one stream's frame on a scheduler worker: motion gate, backend, state machine"""
+        raw_detection = stream.motion_gate.check(frame)
+        if raw_detection is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            analysis = backend.analyze(gray, self.thresholds, self.detection_scale, stream.tracker)
+            log_diagnostics(backend.label, analysis)
+            raw_detection = bool(analysis["looking_down"].any())
+            stream.motion_gate.store(raw_detection)
+
+        previous = stream.update(raw_detection)
+        if stream.state != previous:
+            if stream.state == "doomscrolling":
+                logger.warning(f"[{stream.stream_name}] DOOMSCROLLING DETECTED!")
+            else:
+                logger.info(f"[{stream.stream_name}] {stream.state}")
+        self.analytics.record("multicam", f"multicam-{stream.stream_name}", stream.state == "doomscrolling")
+
+    def report(self, elapsed, cpu_seconds, busy_seconds):
+        for stream in self.streams:
+            logger.info(stream.summary())
+        logger.info(f"Pool: {self.scheduler.workers} workers {busy_seconds / (elapsed * self.scheduler.workers):.0%} busy, "
+                    f"process CPU {cpu_seconds / elapsed:.2f} of {os.cpu_count()} cores")
+
+    def run(self):
+        """Start every stream and the pool, report every STATS_INTERVAL_SECONDS until Ctrl+C"""
+        logger.info("Multi-camera monitoring started, press Ctrl+C to quit")
+        self.analytics.start()
+        for stream in self.streams:
+            stream.start()
+        self.scheduler.start()
+        try:
+            last_wall, last_cpu, last_busy = time.monotonic(), time.process_time(), 0.0
+            while True:
+                time.sleep(STATS_INTERVAL_SECONDS)
+                wall, cpu, busy = time.monotonic(), time.process_time(), self.scheduler.busy_seconds
+                self.report(wall - last_wall, cpu - last_cpu, busy - last_busy)
+                last_wall, last_cpu, last_busy = wall, cpu, busy
+        except KeyboardInterrupt:
+            logger.info("User requested quit")
+        finally:
+            for stream in self.streams:
+                stream.stop()
+            self.scheduler.stop()
+            for stream in self.streams:
+                stream.join(timeout=1.0)
+            self.analytics.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Doomscrolling Blocker for several cameras in one process")
+    parser.add_argument("--config", default="config.json")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    setup_logging(config.get('logging'), log_file='doomscroll_blocker.log')
+
+    MultiCamMonitor(config).run()
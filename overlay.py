@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+# Red warning band across the top of the frame while doomscrolling: rows 0-150 inclusive,
+# the same rows a filled cv2.rectangle((0, 0), (w, 150)) covers
+BANNER_HEIGHT = 151
+BANNER_COLOR = (0, 0, 255)
+BANNER_ALPHA = 0.4
+
+WHITE = (255, 255, 255)
+
+# Gap between an inset video and the frame edges
+INSET_MARGIN = 10
+
+
+class TextSprite:
+    """A piece of text rasterized once; drawing it is a masked copy into the frame"""
+
+    def __init__(self, text, font, scale, color, thickness):
+        (width, height), baseline = cv2.getTextSize(text, font, scale, thickness)
+        # Position of the putText origin (baseline-left) inside the sprite
+        self.origin = (thickness, height + thickness)
+        size = (height + baseline + 2 * thickness, width + 2 * thickness)
+
+        self.image = np.zeros(size + (3,), dtype=np.uint8)
+        cv2.putText(self.image, text, self.origin, font, scale, color, thickness)
+        mask = np.zeros(size, dtype=np.uint8)
+        cv2.putText(mask, text, self.origin, font, scale, 255, thickness)
+        self.mask = (mask > 0)[..., None]
+
+    def draw(self, frame, org):
+        """Same pixels as cv2.putText(frame, text, org, ...), clipped to the frame"""
+        x0, y0 = org[0] - self.origin[0], org[1] - self.origin[1]
+        h, w = self.image.shape[:2]
+        fx0, fy0 = max(0, x0), max(0, y0)
+        fx1, fy1 = min(frame.shape[1], x0 + w), min(frame.shape[0], y0 + h)
+        if fx1 <= fx0 or fy1 <= fy0:
+            return
+        sx, sy = fx0 - x0, fy0 - y0
+        np.copyto(frame[fy0:fy1, fx0:fx1], self.image[sy:sy + fy1 - fy0, sx:sx + fx1 - fx0],
+                  where=self.mask[sy:sy + fy1 - fy0, sx:sx + fx1 - fx0])
+
+
+class OverlayRenderer:
+    """Draws the desktop status overlays in place from cached sprites
+
+    Text is rasterized once per message and style, and the warning band is
+    blended only over the top rows of the frame, so drawing a frame allocates
+    nothing after the first time a message or frame width is seen.
+    """
+
+    def __init__(self):
+        self._sprites = {}
+        self._bands = {}
+
+    def sprite(self, text, font=cv2.FONT_HERSHEY_SIMPLEX, scale=0.7, color=WHITE, thickness=2):
+        key = (text, font, scale, color, thickness)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._sprites[key] = TextSprite(text, font, scale, color, thickness)
+        return sprite
+
+    def _band(self, width):
+        """Solid banner color for a frame `width` pixels wide"""
+        band = self._bands.get(width)
+        if band is None:
+            band = self._bands[width] = np.full((BANNER_HEIGHT, width, 3), BANNER_COLOR, dtype=np.uint8)
+        return band
+
+    def banner(self, frame, message):
+        """Red band with the warning and the current roast"""
+        h, w = frame.shape[:2]
+        band = frame[:min(BANNER_HEIGHT, h)]
+        cv2.addWeighted(self._band(w)[:band.shape[0]], BANNER_ALPHA, band, 1 - BANNER_ALPHA, 0, dst=band)
+
+        self.sprite("DOOMSCROLLING DETECTED!", cv2.FONT_HERSHEY_DUPLEX, 1.0, WHITE, 3).draw(frame, (w//2 - 250, 50))
+        self.sprite(message, cv2.FONT_HERSHEY_SIMPLEX, 0.8, WHITE, 2).draw(frame, (w//2 - 300, 100))
+
+    def label(self, frame, text, color):
+        """Status line in the top-left corner"""
+        self.sprite(text, cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2).draw(frame, (10, 30))
+
+    def inset(self, frame, clip):
+        """Copy `clip` into the bottom-right corner of the frame, shrunk to fit if the frame is smaller"""
+        h, w = frame.shape[:2]
+        ch, cw = clip.shape[:2]
+        fit = min(1.0, (h - 2 * INSET_MARGIN) / ch, (w - 2 * INSET_MARGIN) / cw)
+        if fit <= 0:
+            return
+        if fit < 1.0:
+            clip = cv2.resize(clip, (max(1, int(cw * fit)), max(1, int(ch * fit))), interpolation=cv2.INTER_AREA)
+            ch, cw = clip.shape[:2]
+        frame[h - INSET_MARGIN - ch:h - INSET_MARGIN, w - INSET_MARGIN - cw:w - INSET_MARGIN] = clip
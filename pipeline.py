@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LatestSlot:
+    """Single-slot mailbox: each put replaces the previous item, so readers only see fresh data"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+
+    def put(self, item):
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after_seq=0, timeout=None):
+        """Wait for an item newer than `after_seq`; returns (seq, item), item is None on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                return after_seq, None
+            return self._seq, self._item
+
+    def peek(self):
+        """Newest (seq, item) without waiting"""
+        with self._cond:
+            return self._seq, self._item
+
+
+class StageStats:
+    """Rolling FPS and latency for one pipeline stage
+
+    Only the owning stage thread records; readers take a snapshot of the
+    window, which is safe under the GIL.
+    """
+
+    def __init__(self, name, window=120):
+        self.name = name
+        self._samples = deque(maxlen=window)
+
+    def record(self, latency):
+        self._samples.append((time.monotonic(), latency))
+
+    def fps(self):
+        samples = list(self._samples)
+        if len(samples) < 2:
+            return 0.0
+        span = samples[-1][0] - samples[0][0]
+        return (len(samples) - 1) / span if span > 0 else 0.0
+
+    def latency_ms(self, percentile=50):
+        samples = list(self._samples)
+        if not samples:
+            return 0.0
+        return float(np.percentile([latency for _, latency in samples], percentile) * 1e3)
+
+    def summary(self):
+        return (f"{self.name} {self.fps():.1f} fps "
+                f"(p50 {self.latency_ms(50):.1f} ms, p95 {self.latency_ms(95):.1f} ms)")
+
+
+class CaptureThread(threading.Thread):
+    """Reads the camera as fast as it delivers and publishes only the newest frame
+
+    Publishes (frame, capture_timestamp) and then calls `on_frame()` if
+    given. Stops after `max_failures` consecutive failed reads so the caller
+    can reconnect.
+    """
+
+    def __init__(self, cap, max_failures=50, name="capture", on_frame=None):
+        super().__init__(name=name, daemon=True)
+        self.cap = cap
+        self.max_failures = max_failures
+        self.on_frame = on_frame
+        self.frames = LatestSlot()
+        self.stats = StageStats("capture")
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        failures = 0
+        while not self._stop_event.is_set() and self.cap.isOpened():
+            start = time.monotonic()
+            success, frame = self.cap.read()
+            if not success:
+                failures += 1
+                if failures >= self.max_failures:
+                    logger.warning("Failed to grab frames - camera lost")
+                    break
+                time.sleep(0.01)
+                continue
+
+            failures = 0
+            captured_at = time.monotonic()
+            self.stats.record(captured_at - start)
+            self.frames.put((frame, captured_at))
+            if self.on_frame is not None:
+                self.on_frame()
+
+
+class DetectionWorker(threading.Thread):
+    """Runs `detect(frame)` on the newest captured frame and publishes the result
+
+    Frames that arrive while a detection is running are skipped, so results
+    never lag behind a queue of stale frames. With `min_interval` > 0,
+    detections start at most once per `min_interval` seconds.
+    Publishes (result, capture_timestamp).
+    """
+
+    def __init__(self, frames, detect, min_interval=0.0):
+        super().__init__(name="detection", daemon=True)
+        self.frames = frames
+        self.detect = detect
+        self.min_interval = min_interval
+        self.results = LatestSlot()
+        self.stats = StageStats("detect")
+        self.lag_stats = StageStats("capture-to-result")
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        seq = 0
+        while not self._stop_event.is_set():
+            seq, item = self.frames.get(seq, timeout=0.1)
+            if item is None:
+                continue
+
+            frame, captured_at = item
+            start = time.monotonic()
+            try:
+                result = self.detect(frame)
+            except Exception as e:
+                logger.error(f"Detection failed: {e}")
+                continue
+
+            done = time.monotonic()
+            self.stats.record(done - start)
+            self.lag_stats.record(done - captured_at)
+            self.results.put((result, captured_at))
+
+            if self.min_interval > 0:
+                self._stop_event.wait(self.min_interval - (done - start))
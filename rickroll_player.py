@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RickrollPlayer(threading.Thread):
+    """Plays a video inside the app from a ring buffer of decoded frames
+
+    The decoder thread keeps up to `buffer_frames` frames decoded ahead of
+    the playhead, resized to `height` pixels tall, in slots allocated once;
+    it starts filling at construction, so play() shows a frame immediately.
+    The playhead follows the wall clock at the video's frame rate, pause()
+    freezes it and play() resumes from the same position. If decoding falls
+    behind the playhead, the frames already due are grab()bed without being
+    converted or resized, so playback skips ahead instead of drifting. The
+    video loops. There is no audio.
+    """
+
+    def __init__(self, path, height=240, buffer_frames=32):
+        super().__init__(name="rickroll-decoder", daemon=True)
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        source_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.size = (max(1, round(width * height / source_height)), height)
+        self._slots = np.empty((buffer_frames, height, self.size[0], 3), dtype=np.uint8)
+        self._indices = np.zeros(buffer_frames, dtype=np.int64)  # Playback frame number held by each slot
+
+        self._cond = threading.Condition()
+        self._written = 0  # Slots filled so far (next slot is _written % buffer_frames)
+        self._shown = -1  # Slot count on screen; that slot is not overwritten until playback moves on
+        self._next_index = 0  # Playback frame number (counting across loops) the next read returns
+        self._stop_event = threading.Event()
+
+        self.playing = False
+        self._position = 0.0  # Playhead in frames while paused
+        self._resumed_at = 0.0
+        self.start()
+
+    def _next_frame(self, raw=None, decode=True):
+        """read() the next frame (only grab() it with decode=False), looping at the end of the clip"""
+        for _ in range(2):
+            ok, raw = self.cap.read(raw) if decode else (self.cap.grab(), raw)
+            if ok:
+                self._next_index += 1
+                return True, raw
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return False, raw
+
+    def run(self):
+        capacity = len(self._slots)
+        raw = None
+        while not self._stop_event.is_set():
+            with self._cond:
+                # Free slots are the ones playback has moved past
+                self._cond.wait_for(lambda: self._written - max(self._shown, 0) < capacity
+                                    or self._stop_event.is_set())
+                if self._stop_event.is_set():
+                    break
+                slot = self._written % capacity
+
+            # Behind the playhead: frames already due would never be shown, so only grab() them
+            ok = True
+            while ok and self._next_index < int(self.playhead()):
+                ok, _ = self._next_frame(decode=False)
+            index = self._next_index
+            if ok:
+                ok, raw = self._next_frame(raw)
+            if not ok:
+                logger.error(f"Could not decode {self.path}, stopping playback")
+                break
+            cv2.resize(raw, self.size, dst=self._slots[slot], interpolation=cv2.INTER_AREA)
+
+            with self._cond:
+                self._indices[slot] = index
+                self._written += 1
+                self._cond.notify_all()
+        self.cap.release()
+
+    def playhead(self):
+        if not self.playing:
+            return self._position
+        return self._position + (time.monotonic() - self._resumed_at) * self.fps
+
+    def play(self):
+        """Start, or resume from where pause() left off"""
+        if not self.playing:
+            self._resumed_at = time.monotonic()
+            self.playing = True
+
+    def pause(self):
+        if self.playing:
+            self._position = self.playhead()
+            self.playing = False
+
+    def frame(self):
+        """Latest decoded frame not ahead of the playhead (the oldest one if all are); None before the first
+
+        The returned array is only valid until the next call.
+        """
+        target = int(self.playhead())
+        capacity = len(self._slots)
+        with self._cond:
+            if self._written == 0:
+                return None
+            shown = max(self._shown, 0)
+            while shown + 1 < self._written and self._indices[(shown + 1) % capacity] <= target:
+                shown += 1
+            if shown != self._shown:
+                self._shown = shown
+                self._cond.notify_all()
+            return self._slots[shown % capacity]
+
+    def close(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.join(timeout=1.0)
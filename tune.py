@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from backends import select_backend
+from detection import DEFAULT_THRESHOLDS, haar_features, load_thresholds, score_haar_features, score_landmarks
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# Corpus subdirectories and the label their images get
+LABEL_DIRS = {"doomscrolling": True, "normal": False}
+
+# Searched threshold ranges (low, high) per backend; integer thresholds list their values
+HAAR_GRID = {
+    "face_position_ratio": (0.50, 0.66),
+    "face_position_ratio_low": (0.44, 0.60),
+    "face_aspect_ratio": (0.9, 1.3),
+    "eye_position_ratio": (0.50, 0.70),
+    "eye_position_ratio_low": (0.42, 0.62),
+    "score_threshold": [2, 3, 4, 5],
+}
+DLIB_GRID = {
+    "head_tilt": (1.0, 1.6),
+    "eye_ratio": (0.20, 0.50),
+}
+# Each "_low" threshold must not exceed its high counterpart
+ORDERED_PAIRS = (("face_position_ratio_low", "face_position_ratio"), ("eye_position_ratio_low", "eye_position_ratio"))
+
+# Threshold sets scored per NumPy pass; bounds the (sets, faces) intermediate arrays
+CHUNK_SIZE = 2048
+
+
+def list_corpus(corpus_dir):
+    """(paths, labels) of a corpus laid out as doomscrolling/ and normal/ image folders"""
+    paths, labels = [], []
+    for name, label in LABEL_DIRS.items():
+        folder = os.path.join(corpus_dir, name)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(folder, filename))
+                labels.append(label)
+    if not paths:
+        raise SystemExit(f"No images found in {corpus_dir}/doomscrolling or {corpus_dir}/normal")
+    return paths, np.array(labels, dtype=bool)
+
+
+def cache_path(cache_dir, paths, backend_label, scale):
+    """Cache file for this corpus state (names, sizes, mtimes), backend and detection scale"""
+    digest = hashlib.sha1(f"{backend_label}|{scale}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"|{path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    return os.path.join(cache_dir, f"{digest.hexdigest()[:16]}.npz")
+
+
+_backend = None
+_scale = 1.0
+
+
+def _init_worker(config):
+    global _backend, _scale
+    logging.getLogger().setLevel(logging.WARNING)
+    _backend, _ = select_backend(config)
+    _scale = config.get('detection', {}).get('scale', 1.0)
+
+
+def _detect(path):
+    """Raw detector output for one image: (frame height, faces, eyes or landmarks), None if unreadable"""
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    analysis = _backend.analyze(gray, DEFAULT_THRESHOLDS, _scale)
+    parts = analysis["landmarks"] if _backend.kind == "dlib" else analysis["eyes"]
+    return gray.shape[0], analysis["faces"], parts
+
+
+def extract(paths, labels, config, kind, jobs):
+    """Run the detector once per image on a process pool; returns the arrays that get cached"""
+    frame_height = np.zeros(len(paths), dtype=np.int32)
+    readable = np.ones(len(paths), dtype=bool)
+    face_frame, faces, eye_face, eyes, landmarks = [], [], [], [], []
+    face_count = 0
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(config,)) as executor:
+        results = executor.map(_detect, paths, chunksize=max(1, len(paths) // (jobs * 8)))
+        for i, result in enumerate(results):
+            if result is None:
+                logging.warning(f"Skipping unreadable image {paths[i]}")
+                readable[i] = False
+                continue
+            frame_height[i], frame_faces, parts = result
+            face_frame.append(np.full(len(frame_faces), i, dtype=np.int32))
+            faces.append(frame_faces)
+            if kind == "dlib":
+                landmarks.append(parts)
+            else:
+                for j, face_eyes in enumerate(parts):
+                    eye_face.append(np.full(len(face_eyes), face_count + j, dtype=np.int32))
+                    eyes.append(face_eyes)
+            face_count += len(frame_faces)
+
+    arrays = {
+        "paths": np.array(paths), "labels": labels, "readable": readable, "frame_height": frame_height,
+        "face_frame": np.concatenate(face_frame) if face_frame else np.zeros(0, dtype=np.int32),
+        "faces": np.concatenate(faces).astype(np.int32) if faces else np.zeros((0, 4), dtype=np.int32),
+    }
+    if kind == "dlib":
+        arrays["landmarks"] = (np.concatenate(landmarks).astype(np.int32) if landmarks
+                               else np.zeros((0, 15, 2), dtype=np.int32))
+    else:
+        arrays["eye_face"] = np.concatenate(eye_face) if eye_face else np.zeros(0, dtype=np.int32)
+        arrays["eyes"] = np.concatenate(eyes).astype(np.int32) if eyes else np.zeros((0, 4), dtype=np.int32)
+    return arrays
+
+
+def face_scorer(kind, data):
+    """Function mapping a thresholds dict of (C, 1) arrays to (C, faces) looking-down booleans"""
+    if kind == "dlib":
+        landmarks = data["landmarks"]
+        return lambda thresholds: score_landmarks(landmarks, thresholds)["looking_down"]
+
+    counts = np.bincount(data["eye_face"], minlength=len(data["faces"]))
+    eyes = np.split(data["eyes"], np.cumsum(counts)[:-1])
+    features = haar_features(data["faces"], eyes, data["frame_height"][data["face_frame"]])
+    return lambda thresholds: score_haar_features(features, thresholds)[1]
+
+
+def build_grid(kind, steps):
+    """Every threshold combination of the backend's grid as a dict of equal-length 1-D arrays"""
+    ranges = DLIB_GRID if kind == "dlib" else HAAR_GRID
+    axes = [np.array(r) if isinstance(r, list) else np.round(np.linspace(r[0], r[1], steps), 3)
+            for r in ranges.values()]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    grid = {key: values.ravel() for key, values in zip(ranges, mesh)}
+    valid = np.ones(len(mesh[0].ravel()), dtype=bool)
+    for low, high in ORDERED_PAIRS:
+        if low in grid:
+            valid &= grid[low] <= grid[high]
+    return {key: values[valid] for key, values in grid.items()}
+
+
+def evaluate(score_faces, data, grid, beta=1.0):
+    """Precision, recall and F-beta per threshold set; frames without faces count as normal"""
+    labels = data["labels"][data["readable"]]
+    readable_index = np.cumsum(data["readable"]) - 1
+    face_frame = readable_index[data["face_frame"]]
+    starts = np.flatnonzero(np.r_[True, face_frame[1:] != face_frame[:-1]]) if len(face_frame) else []
+    framed = face_frame[starts] if len(face_frame) else []
+
+    total = len(next(iter(grid.values())))
+    tp, predicted = np.zeros(total), np.zeros(total)
+    for start in range(0, total, CHUNK_SIZE):
+        thresholds = {key: values[start:start + CHUNK_SIZE, None] for key, values in grid.items()}
+        count = len(thresholds[next(iter(thresholds))])
+        frame_pred = np.zeros((count, len(labels)), dtype=bool)
+        if len(starts):
+            frame_pred[:, framed] = np.logical_or.reduceat(score_faces(thresholds), starts, axis=1)
+        tp[start:start + count] = (frame_pred & labels).sum(axis=1)
+        predicted[start:start + count] = frame_pred.sum(axis=1)
+
+    precision = np.divide(tp, predicted, out=np.zeros(total), where=predicted > 0)
+    recall = tp / max(labels.sum(), 1)
+    denominator = beta ** 2 * precision + recall
+    f_score = np.divide((1 + beta ** 2) * precision * recall, denominator,
+                        out=np.zeros(total), where=denominator > 0)
+    return precision, recall, f_score
+
+
+def write_thresholds(config_path, thresholds):
+    """Update the `detection` section of config.json in place, keeping everything else"""
+    with open(config_path) as f:
+        config = json.load(f)
+    config.setdefault('detection', {}).update(thresholds)
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=4, ensure_ascii=False)
+        f.write("\n")
+
+
+def threshold_values(grid, index):
+    return {key: (int(values[index]) if key == "score_threshold" else float(values[index]))
+            for key, values in grid.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the scoring thresholds over a labeled frame corpus")
+    parser.add_argument("--corpus", required=True, help="folder with doomscrolling/ and normal/ image folders")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--backend", help="backend to tune (default: backends.backend from the config)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="detector processes")
+    parser.add_argument("--cache-dir", default=".tune_cache", help="where raw detections are cached")
+    parser.add_argument("--steps", type=int, default=6, help="values tried per continuous threshold")
+    parser.add_argument("--beta", type=float, default=1.0, help="F-beta weight: >1 favors recall")
+    parser.add_argument("--top", type=int, default=10, help="rows in the results table")
+    parser.add_argument("--output", help="also write the results as JSON")
+    parser.add_argument("--write", action="store_true", help="store the best thresholds in the config")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    with open(args.config) as f:
+        config = json.load(f)
+    # Tune exactly one backend; calibration would pick it per machine instead
+    config['backends'] = {**config.get('backends', {}), 'calibrate': False}
+    if args.backend:
+        config['backends']['backend'] = args.backend
+    backend, _ = select_backend(config)
+    scale = config.get('detection', {}).get('scale', 1.0)
+
+    paths, labels = list_corpus(args.corpus)
+    cache_file = cache_path(args.cache_dir, paths, backend.label, scale)
+    start = time.perf_counter()
+    if os.path.exists(cache_file):
+        data = dict(np.load(cache_file))
+        print(f"Loaded raw detections for {len(paths)} images from {cache_file}")
+    else:
+        data = extract(paths, labels, config, backend.kind, args.jobs)
+        os.makedirs(args.cache_dir, exist_ok=True)
+        np.savez_compressed(cache_file, **data)
+        print(f"Ran {backend.label} on {len(paths)} images with {args.jobs} processes in "
+              f"{time.perf_counter() - start:.1f} s, cached in {cache_file}")
+
+    score_faces = face_scorer(backend.kind, data)
+    grid = build_grid(backend.kind, args.steps)
+    start = time.perf_counter()
+    precision, recall, f_score = evaluate(score_faces, data, grid, args.beta)
+    print(f"Scored {len(f_score)} threshold sets in {time.perf_counter() - start:.2f} s "
+          f"({int(labels.sum())} doomscrolling / {int((~labels).sum())} normal images)")
+
+    current = load_thresholds(config)
+    current_grid = {key: np.array([current[key]]) for key in grid}
+    current_scores = [float(v[0]) for v in evaluate(score_faces, data, current_grid, args.beta)]
+    order = np.lexsort((-precision, -f_score))[:args.top]
+
+    keys = list(grid)
+    print(f"{'F':>6} {'prec':>6} {'recall':>6}  " + " ".join(f"{key:>10.10}" for key in keys))
+    print(f"{current_scores[2]:>6.3f} {current_scores[0]:>6.3f} {current_scores[1]:>6.3f}  "
+          + " ".join(f"{current[key]:>10}" for key in keys) + "  (current)")
+    for i in order:
+        print(f"{f_score[i]:>6.3f} {precision[i]:>6.3f} {recall[i]:>6.3f}  "
+              + " ".join(f"{grid[key][i]:>10}" for key in keys))
+
+    best = threshold_values(grid, order[0])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "corpus": args.corpus, "backend": backend.label, "beta": args.beta, "sets": len(f_score),
+                "current": {"thresholds": {key: current[key] for key in keys}, "precision": current_scores[0],
+                            "recall": current_scores[1], "f_score": current_scores[2]},
+                "top": [{"thresholds": threshold_values(grid, i), "precision": float(precision[i]),
+                         "recall": float(recall[i]), "f_score": float(f_score[i])} for i in order],
+            }, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.write:
+        write_thresholds(args.config, best)
+        print(f"Updated the detection section of {args.config}: {best}")
+
+
+if __name__ == "__main__":
+    main()
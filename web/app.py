@@ -1,23 +1,99 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+import time
+
+# Measured from the very first import so cold-start logs include import time
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
 from pydantic import BaseModel
-import cv2
-import numpy as np
+import asyncio
 import base64
+import json
 import logging
-from io import BytesIO
-from PIL import Image
-import os
+import math
+import random
+import uuid
+
+from assets import AssetStore
+from detector import DetectionModels, load_config, load_roasts
+from workers import DetectionPool, PoolSaturated
+from metrics import DetectionMetrics
+from analytics import AnalyticsStore
+from detection import FaceTracker, MotionGate
+from logging_setup import sampled_logger, setup_logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Loaded at import so a preloading server (gunicorn --preload) shares them across forked workers
+config = load_config()
+
+# Queued logging (uvicorn's own loggers included) so requests never wait on stdout
+setup_logging(config.get("logging"), reroute=("uvicorn", "uvicorn.access"))
 logger = logging.getLogger(__name__)
+responses_log = sampled_logger("doomscroll.responses")
+logger.info(f"Imports took {(time.perf_counter() - IMPORT_STARTED) * 1e3:.0f} ms")
+
+roasts = load_roasts(config)
+models = DetectionModels(config)
+detection_pool = DetectionPool.from_config(config)
+metrics = DetectionMetrics(detection_pool, models=models)
+analytics = AnalyticsStore.from_config(config)
+# Page, CSS, JS and video held in memory (precompressed, memory-mapped for the video)
+assets = AssetStore()
+
+# Endpoints whose request count and latency are tracked in /metrics
+METERED_PATHS = ("/api/detect", "/api/detect/frame")
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start and warm up the detection workers (and the history writer) before accepting requests"""
+    await detection_pool.start(models)
+    analytics.start()
+    logger.info(f"Startup complete in {(time.perf_counter() - IMPORT_STARTED) * 1e3:.0f} ms")
+    yield
+    detection_pool.shutdown()
+    analytics.stop()
+
+app = FastAPI(title="Doomscrolling Blocker API", lifespan=lifespan)
+
+class RequestMetricsMiddleware:
+    """Count and time detection requests, including the ones that fail
+
+    Plain ASGI rather than @app.middleware("http"): everything else (static
+    files, the streamed video, WebSockets) passes straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
 
-app = FastAPI(title="Doomscrolling Blocker API")
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in METERED_PATHS:
+            await self.app(scope, receive, send)
+            return
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.observe_request(scope["path"], status, time.perf_counter() - start)
+
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def static_file(name: str, request: Request, v: str = None):
+    """Static assets from memory; URLs carrying the current ?v= content hash are cacheable for good"""
+    asset = assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return assets.serve(request, asset, versioned=v == asset.version)
 
 class ImageData(BaseModel):
     image: str
@@ -26,180 +102,419 @@ class DetectionResponse(BaseModel):
     doomscrolling: bool
     message: str
     boxes: list = []  # Added to return coordinates
+    next_capture_ms: int = 0  # When the client should send its next frame
+    crop: dict | None = None  # Region to upload next (full-frame x, y, w, h); None = whole frame
 
-class DoomscrollDetectorAPI:
-    def __init__(self):
-        """Initialize detector for API use (no GUI)"""
-        try:
-            import dlib
-            self.use_dlib = True
-            self.detector = dlib.get_frontal_face_detector()
-            self.predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
-            logger.info("Using dlib for face tracking")
-        except:
-            self.use_dlib = False
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
-            self.eye_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_eye.xml'
-            )
-            
-            # Load roasting messages from root config
-            import json
-            try:
-                # Try both paths just in case
-                config_path = "../config.json" if os.path.exists("../config.json") else "config.json"
-                with open(config_path, "r") as f:
-                    config = json.load(f)
-                    self.roasts = config['roasting']['messages']
-            except Exception as e:
-                logger.warning(f"Could not load roasts: {e}")
-                self.roasts = ["PUT. THE. PHONE. DOWN. NOW."]
-            
-            logger.info("Using OpenCV Haar Cascades for face tracking")
-
-    def detect_doomscroll(self, frame):
-        """Detect doomscrolling from a single frame"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        if self.use_dlib:
-            return self._detect_dlib(frame, gray)
+class StreamDetectionResponse(DetectionResponse):
+    seq: int
+    consecutive_bad: int
+    triggered: bool
+
+# Content types accepted as a raw frame body on /api/detect/frame
+BINARY_CONTENT_TYPES = ("application/octet-stream", "image/jpeg", "image/webp", "image/png")
+
+class DetectionSession:
+    """Detection state kept for one streaming connection or HTTP session id"""
+
+    def __init__(self, bad_threshold=1, session_id=None):
+        self.session_id = session_id
+        self.bad_threshold = max(1, bad_threshold)
+        self.consecutive_bad = 0
+        self.consecutive_good = 0
+        self.last_face_box = None
+        self.tracker = FaceTracker.from_config(config)
+        self.motion_gate = MotionGate.from_config(config)
+        self.last_seen = time.monotonic()
+        self.cooldown_until = 0.0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.cropped_frames = 0  # Cropped uploads since the last full frame
+
+    def in_cooldown(self):
+        return time.monotonic() < self.cooldown_until
+
+    def cooldown_remaining(self):
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def start_cooldown(self, seconds):
+        """Ignore frames for `seconds` (client dismissed the rickroll)"""
+        self.cooldown_until = time.monotonic() + seconds
+        self.consecutive_bad = 0
+
+    @property
+    def triggered(self):
+        """True once the bad streak has reached the threshold"""
+        return self.consecutive_bad >= self.bad_threshold
+
+    def update(self, is_doomscrolling, boxes, cropped=False):
+        """Fold one detection into the session; returns True once the bad streak hits the threshold"""
+        self.cropped_frames = self.cropped_frames + 1 if cropped else 0
+
+        if is_doomscrolling:
+            self.consecutive_bad += 1
+            self.consecutive_good = 0
         else:
-            return self._detect_opencv(frame, gray)
-
-    def _detect_opencv(self, frame, gray):
-        """OpenCV-based detection with score-based smoothing"""
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-        boxes = []
-        is_doomscrolling = False
-        
-        for (x, y, w, h) in faces:
-            boxes.append({"type": "face", "x": int(x), "y": int(y), "w": int(w), "h": int(h)})
-            roi_gray = gray[y:y+int(h*0.6), x:x+w]
-            eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 5)
-            
-            detection_score = 0
-            face_center_y = y + h//2
-            frame_height = frame.shape[0]
-            face_position_ratio = face_center_y / frame_height
-            
-            # Match main.py logic EXACTLY
-            if face_position_ratio > 0.58:
-                detection_score += 2
-            elif face_position_ratio > 0.52:
-                detection_score += 1
-            
-            aspect_ratio = h / w
-            if aspect_ratio < 1.1:
-                detection_score += 1
-            
-            eye_position_in_face = 0
-            if len(eyes) >= 2:
-                for (ex, ey, ew, eh) in eyes:
-                    boxes.append({
-                        "type": "eye", 
-                        "x": int(x + ex), 
-                        "y": int(y + ey), 
-                        "w": int(ew), 
-                        "h": int(eh)
-                    })
-                eye_y_positions = [y + ey + eh//2 for (ex, ey, ew, eh) in eyes]
-                avg_eye_y = sum(eye_y_positions) / len(eye_y_positions)
-                eye_position_in_face = (avg_eye_y - y) / h
-                
-                # Ultra sensitive eye level
-                if eye_position_in_face > 0.55:
-                    detection_score += 2
-                elif eye_position_in_face > 0.50:
-                    detection_score += 1
-            elif len(eyes) < 2:
-                detection_score += 1
-            
-            # Match main.py logic: Score 3+ is bad
-            if detection_score >= 3:
-                is_doomscrolling = True
-                
-            logger.info(f"DETECTION [OPENCV]: Score={detection_score}, FaceRatio={face_position_ratio:.2f}, EyeLevel={eye_position_in_face:.2f}, Eyes={len(eyes)}, Result={is_doomscrolling}")
-        
-        return is_doomscrolling, boxes
-
-    def _detect_dlib(self, frame, gray):
-        """dlib-based detection"""
-        faces = self.detector(gray)
-        boxes = []
-        is_doomscrolling = False
-        
-        for face in faces:
-            x, y, w, h = face.left(), face.top(), face.width(), face.height()
-            boxes.append({"type": "face", "x": int(x), "y": int(y), "w": int(w), "h": int(h)})
-            
-            landmarks = self.predictor(gray, face)
-            nose_tip = (landmarks.part(30).x, landmarks.part(30).y)
-            chin = (landmarks.part(8).x, landmarks.part(8).y)
-            forehead_approx = (landmarks.part(27).x, landmarks.part(27).y)
-            
-            left_eye_points = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(36, 42)]
-            right_eye_points = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(42, 48)]
-            
-            left_eye_top = (left_eye_points[1][1] + left_eye_points[2][1]) / 2
-            left_eye_bottom = (left_eye_points[4][1] + left_eye_points[5][1]) / 2
-            left_eye_center = (left_eye_points[0][1] + left_eye_points[3][1]) / 2
-            
-            right_eye_top = (right_eye_points[1][1] + right_eye_points[2][1]) / 2
-            right_eye_bottom = (right_eye_points[4][1] + right_eye_points[5][1]) / 2
-            right_eye_center = (right_eye_points[0][1] + right_eye_points[3][1]) / 2
-            
-            left_ratio = abs(left_eye_center - left_eye_top) / (abs(left_eye_bottom - left_eye_top) + 1e-6)
-            right_ratio = abs(right_eye_center - right_eye_top) / (abs(right_eye_bottom - right_eye_top) + 1e-6)
-            eye_ratio = (left_ratio + right_ratio) / 2
-            
-            head_tilt = (chin[1] - nose_tip[1]) / (nose_tip[1] - forehead_approx[1] + 1e-6)
-            
-            if head_tilt > 1.3 or eye_ratio < 0.35:
-                is_doomscrolling = True
-        
-        return is_doomscrolling, boxes
-
-# Initialize detector
-detector = DoomscrollDetectorAPI()
+            self.consecutive_bad = 0
+            self.consecutive_good += 1
+
+        # Forget the face as soon as a frame comes back without one, so the next upload is a full frame
+        face_boxes = [box for box in boxes if box["type"] == "face"]
+        self.last_face_box = max(face_boxes, key=lambda box: box["w"] * box["h"]) if face_boxes else None
+
+        return self.triggered
+
+class CaptureSchedule:
+    """Recommends how long a client should wait before sending its next frame
+
+    Fast while a session looks suspicious (a bad streak below the trigger
+    threshold), slow once it has been steadily focused, and for the rest of
+    a cooldown while one is active. Every delay is stretched as the
+    detection pool fills up, so clients back off before it saturates.
+    """
+
+    def __init__(self, suspicious_ms=250, normal_ms=750, focused_ms=2000, focused_after_frames=10,
+                 load_backoff=3.0):
+        self.suspicious_ms = suspicious_ms
+        self.normal_ms = normal_ms
+        self.focused_ms = focused_ms
+        self.focused_after_frames = focused_after_frames
+        self.load_backoff = load_backoff
+
+    @classmethod
+    def from_config(cls, config):
+        scheduling = config.get('scheduling', {})
+        return cls(
+            suspicious_ms=scheduling.get('suspicious_ms', 250),
+            normal_ms=scheduling.get('normal_ms', 750),
+            focused_ms=scheduling.get('focused_ms', 2000),
+            focused_after_frames=scheduling.get('focused_after_frames', 10),
+            load_backoff=scheduling.get('load_backoff', 3.0)
+        )
+
+    def next_capture_ms(self, session=None):
+        if session is None:
+            delay = self.normal_ms
+        elif session.in_cooldown():
+            return int(session.cooldown_remaining() * 1000)
+        elif session.consecutive_bad and not session.triggered:
+            delay = self.suspicious_ms
+        elif session.consecutive_good >= self.focused_after_frames:
+            delay = self.focused_ms
+        else:
+            delay = self.normal_ms
+
+        utilization = min(1.0, detection_pool.in_flight / detection_pool.capacity)
+        return int(delay * (1 + self.load_backoff * utilization))
+
+capture_schedule = CaptureSchedule.from_config(config)
+
+class CropPolicy:
+    """Decides which region a session's client should upload next
+
+    After a face is found the client is asked for just the padded face box;
+    every `full_frame_interval` uploads, or once the face is lost, it is
+    asked for the whole frame again so new or moved faces are picked up.
+    """
+
+    def __init__(self, enabled=True, padding=0.5, full_frame_interval=10):
+        self.enabled = enabled
+        self.padding = padding
+        self.full_frame_interval = full_frame_interval
+
+    @classmethod
+    def from_config(cls, config):
+        crop = config.get('crop', {})
+        return cls(
+            enabled=crop.get('enabled', True),
+            padding=crop.get('padding', 0.5),
+            full_frame_interval=crop.get('full_frame_interval', 10)
+        )
+
+    def hint(self, session):
+        """Padded face box in full-frame coordinates (the client clamps it to its frame), or None"""
+        if not self.enabled or session is None or session.last_face_box is None:
+            return None
+        if session.cropped_frames + 1 >= self.full_frame_interval:
+            return None
+
+        box = session.last_face_box
+        pad_x, pad_y = int(box["w"] * self.padding), int(box["h"] * self.padding)
+        x, y = max(0, box["x"] - pad_x), max(0, box["y"] - pad_y)
+        return {"x": x, "y": y,
+                "w": box["x"] + box["w"] + pad_x - x,
+                "h": box["y"] + box["h"] + pad_y - y}
+
+crop_policy = CropPolicy.from_config(config)
+
+def parse_crop(x, y, frame_height):
+    """(x, y, frame_height) for a cropped upload, None for a full frame"""
+    if x is None and y is None and frame_height is None:
+        return None
+    if x is None or y is None or frame_height is None or x < 0 or y < 0 or frame_height <= 0:
+        raise ValueError("Cropped uploads need crop_x >= 0, crop_y >= 0 and frame_height > 0")
+    return int(x), int(y), int(frame_height)
+
+# Longest pause a client can ask for after dismissing the rickroll
+MAX_COOLDOWN_SECONDS = 3600
+
+def parse_cooldown(seconds):
+    """Cooldown length from a streaming command, capped at MAX_COOLDOWN_SECONDS"""
+    seconds = float(seconds)
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"Cooldown must be a finite number of seconds >= 0, got {seconds}")
+    return min(seconds, MAX_COOLDOWN_SECONDS)
+
+class SessionStore:
+    """HTTP detection sessions keyed by the X-Session-Id header (LRU with idle expiry)"""
+
+    def __init__(self, max_sessions=1000, ttl_seconds=300):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        session = self._sessions.pop(session_id, None)
+        if session is None or now - session.last_seen > self.ttl_seconds:
+            session = DetectionSession(session_id=session_id)
+        session.last_seen = now
+        self._sessions[session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+http_sessions = SessionStore()
+
+async def run_detection(image_bytes, reduce, session=None, crop=None):
+    """Detect on the worker pool, carrying the session's tracker and motion gate through"""
+    tracker = session.tracker if session else None
+    gate = session.motion_gate if session else None
+    skipped = gate.skipped if gate else 0
+
+    is_doomscrolling, boxes, tracker, gate, timings = await detection_pool.detect(
+        image_bytes, reduce, tracker, gate, crop)
+    reused = None if gate is None else gate.skipped > skipped
+    metrics.observe_detection(is_doomscrolling, boxes, timings, reused)
+    if session:
+        session.tracker = tracker
+        session.motion_gate = gate
+        session.update(is_doomscrolling, boxes, cropped=crop is not None)
+    analytics.record("web", session.session_id if session else None,
+                     session.triggered if session else is_doomscrolling)
+    return is_doomscrolling, boxes
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request, exc):
+    """Shed load instead of queueing: tell the client when to come back"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.get("/", response_class=HTMLResponse)
-async def index():
-    """Serve the main page"""
-    with open("templates/index.html", "r") as f:
-        return f.read()
+async def index(request: Request):
+    """Serve the main page (rendered once at startup with versioned asset URLs)"""
+    return assets.serve(request, assets.page)
+
+def build_response(is_doomscrolling, boxes, session=None):
+    """Pick a message and wrap detection output in a DetectionResponse"""
+    message = random.choice(roasts) if is_doomscrolling else 'Monitoring... Good posture!'
+
+    response = DetectionResponse(
+        doomscrolling=is_doomscrolling,
+        message=message,
+        boxes=boxes,
+        next_capture_ms=capture_schedule.next_capture_ms(session),
+        crop=crop_policy.hint(session)
+    )
+    if responses_log.should_log():
+        responses_log.log("response", {"doomscrolling": is_doomscrolling, "boxes": len(boxes),
+                                       "next_capture_ms": response.next_capture_ms})
+    return response
 
 @app.post("/api/detect", response_model=DetectionResponse)
-async def detect(data: ImageData):
-    """API endpoint for detection"""
+async def detect(data: ImageData, reduce: int = 1, x_session_id: str = Header(None)):
+    """API endpoint for detection (base64 data URL in JSON)"""
     try:
-        # Decode base64 image
-        image_data = data.image.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(BytesIO(image_bytes))
-        
-        # Convert to OpenCV format
-        frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Detect
-        is_doomscrolling, boxes = detector.detect_doomscroll(frame)
-        
-        import random
-        message = random.choice(detector.roasts) if is_doomscrolling else 'Monitoring... Good posture!'
-        
-        response = DetectionResponse(
-            doomscrolling=is_doomscrolling,
-            message=message,
-            boxes=boxes
-        )
-        logger.info(f"API RESPONSE: {response.doomscrolling} - {len(response.boxes)} boxes")
-        return response
-    
+        # Decode base64 image straight to grayscale
+        start = time.perf_counter()
+        image_bytes = base64.b64decode(data.image.split(',')[1])
+        metrics.stage_seconds.labels("base64").observe(time.perf_counter() - start)
+
+        session = http_sessions.get(x_session_id) if x_session_id else None
+        is_doomscrolling, boxes = await run_detection(image_bytes, reduce, session)
+        return build_response(is_doomscrolling, boxes, session)
+
+    except (HTTPException, PoolSaturated):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Detection error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/detect/frame", response_model=DetectionResponse)
+async def detect_frame(request: Request, reduce: int = 1, x_session_id: str = Header(None),
+                       crop_x: int = None, crop_y: int = None, frame_height: int = None):
+    """API endpoint for detection (raw JPEG/WebP body or multipart `frame` field)
+
+    A body holding only a region of the client's frame (the `crop` hint of
+    the previous response) gives its top-left corner and the full frame
+    height as crop_x, crop_y and frame_height.
+    """
+    try:
+        crop = parse_crop(crop_x, crop_y, frame_height)
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("frame")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Missing 'frame' file field")
+            image_bytes = await upload.read()
+        elif content_type.startswith(BINARY_CONTENT_TYPES):
+            image_bytes = await request.body()
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+
+        session = http_sessions.get(x_session_id) if x_session_id else None
+        is_doomscrolling, boxes = await run_detection(image_bytes, reduce, session, crop)
+        return build_response(is_doomscrolling, boxes, session)
+
+    except (HTTPException, PoolSaturated):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Detection error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/cooldown")
+async def cooldown(seconds: float = Query(10, ge=0, le=MAX_COOLDOWN_SECONDS), x_session_id: str = Header(...)):
+    """Pause an HTTP session after the client dismissed the rickroll (the WebSocket has its own command)"""
+    session = http_sessions.get(x_session_id)
+    session.start_cooldown(seconds)
+    return {"next_capture_ms": capture_schedule.next_capture_ms(session)}
+
+@app.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket, reduce: int = 1, threshold: int = 1, session: str = None):
+    """Streaming detection: binary frames in, one JSON result out per analyzed frame
+
+    Only the newest unprocessed frame is kept, so a client sending faster
+    than detection runs gets fresh results instead of a growing backlog.
+    Each result carries next_capture_ms for clients that pace themselves.
+    Text messages are control commands, e.g. {"type": "cooldown", "seconds": 10},
+    or {"type": "crop", "x": 120, "y": 40, "frame_height": 480} to say that the
+    following frames are that region of the client's frame ({"type": "crop"}
+    switches back to full frames). `session` is the id detections are
+    recorded under (what /api/stats?session= looks up); a generated ws-...
+    id is used when the client doesn't send one.
+    """
+    await websocket.accept()
+    session = DetectionSession(bad_threshold=threshold, session_id=session or f"ws-{uuid.uuid4().hex[:12]}")
+    latest = {"frame": None, "seq": 0, "crop": None}
+    crop = None
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        nonlocal crop
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                session.frames_received += 1
+                if latest["frame"] is not None:
+                    session.frames_dropped += 1
+                latest["frame"] = message["bytes"]
+                latest["seq"] = session.frames_received
+                latest["crop"] = crop
+                frame_ready.set()
+            elif message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(command, dict):
+                    continue
+                if command.get("type") == "cooldown":
+                    try:
+                        session.start_cooldown(parse_cooldown(command.get("seconds", 10)))
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"Ignoring cooldown command: {e}")
+                elif command.get("type") == "crop":
+                    try:
+                        crop = parse_crop(command.get("x"), command.get("y"), command.get("frame_height"))
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"Ignoring crop command: {e}")
+                        crop = None
+
+    async def process_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            image_bytes, seq, frame_crop = latest["frame"], latest["seq"], latest["crop"]
+            latest["frame"] = None
+            if image_bytes is None:
+                continue
+            if session.in_cooldown():
+                # Still answer, so a client waiting on this frame knows when to resume
+                await websocket.send_json({"seq": seq, "cooldown": True,
+                                           "next_capture_ms": capture_schedule.next_capture_ms(session)})
+                continue
+
+            start = time.perf_counter()
+            try:
+                is_doomscrolling, boxes = await run_detection(image_bytes, reduce, session, frame_crop)
+            except PoolSaturated as e:
+                metrics.observe_request("/ws/detect", 503, time.perf_counter() - start)
+                await websocket.send_json({"seq": seq, "error": str(e), "retry_after": e.retry_after})
+                continue
+            except ValueError as e:
+                metrics.observe_request("/ws/detect", 400, time.perf_counter() - start)
+                await websocket.send_json({"seq": seq, "error": str(e)})
+                continue
+            metrics.observe_request("/ws/detect", 200, time.perf_counter() - start)
+
+            response = build_response(is_doomscrolling, boxes, session)
+            await websocket.send_json(StreamDetectionResponse(
+                **response.model_dump(),
+                seq=seq,
+                consecutive_bad=session.consecutive_bad,
+                triggered=session.triggered
+            ).model_dump())
+
+    tasks = {asyncio.create_task(receive_frames()), asyncio.create_task(process_frames())}
+    done, unfinished = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in unfinished:
+        task.cancel()
+    for task in done:
+        error = task.exception()
+        if error and not isinstance(error, WebSocketDisconnect):
+            logger.error(f"Stream error: {error}")
+
+    logger.info(f"Stream closed: {session.frames_received} frames received, "
+                f"{session.frames_dropped} dropped as stale, {session.motion_gate.summary()}")
+
+@app.get("/api/stats")
+def stats(session: str = None, hours: int = 24, days: int = 30, x_session_id: str = Header(None)):
+    """Doomscroll totals overall, for one session, and per hour/day (read from the rollups, not raw events)
+
+    The session defaults to the caller's X-Session-Id. Recent detections show up
+    within analytics.flush_interval_seconds.
+    """
+    if not analytics.enabled:
+        raise HTTPException(status_code=404, detail="Analytics are disabled")
+    if not 0 <= hours <= 24 * 31 or not 0 <= days <= 3660:
+        raise HTTPException(status_code=400, detail="hours must be 0-744 and days 0-3660")
+    return analytics.stats(session or x_session_id, hours, days)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.expose(), media_type=metrics.registry.CONTENT_TYPE)
+
 @app.get("/health")
 async def health():
     """Health check endpoint for Render"""
@@ -0,0 +1,209 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import mmap
+import os
+import re
+
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+WEB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Text assets get precompressed variants; media is already compressed and is memory-mapped instead
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 512
+# Versioned URLs (?v=<content hash>) never change content, so browsers may keep them for a year
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Unversioned URLs and the page itself: always revalidate, cheap thanks to the ETag
+REVALIDATE_CACHE = "no-cache"
+RANGE_CHUNK_BYTES = 64 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_accept_encoding(header):
+    """{coding: q-value} from an Accept-Encoding header; malformed q-values count as 0"""
+    weights = {}
+    for part in header.lower().split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+class Asset:
+    """One file held in memory: raw bytes (or a memory map), precompressed variants and validators"""
+
+    def __init__(self, name, body, content_type, mapped=False):
+        self.name = name
+        self.body = body
+        self.content_type = content_type
+        self.mapped = mapped
+        digest = hashlib.sha256(body).hexdigest()
+        self.version = digest[:12]
+        self.etag = f'"{digest[:32]}"'
+        self.encoded = {}
+        if not mapped and content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_BYTES:
+            self._compress()
+
+    def _compress(self):
+        variants = {"gzip": gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(self.body, quality=11)
+        # Keep a variant only if it actually saves bytes; its ETag differs from the identity one
+        for encoding, data in variants.items():
+            if len(data) < len(self.body):
+                self.encoded[encoding] = data
+
+    def etag_for(self, encoding):
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+    def negotiate(self, accept_encoding):
+        """Precompressed encoding with the highest q-value (br over gzip on ties), None for identity
+
+        Codings with q=0 are refused, `*` covers codings not listed, and
+        identity is used when the client prefers it over every variant.
+        """
+        weights = parse_accept_encoding(accept_encoding)
+        default = weights.get("*", 0.0)
+        best, best_q = None, 0.0
+        for encoding in ("br", "gzip"):
+            q = weights.get(encoding, default)
+            if encoding in self.encoded and q > best_q:
+                best, best_q = encoding, q
+        identity_q = weights.get("identity", default if "*" in weights else 1.0)
+        return best if best is not None and best_q >= identity_q else None
+
+
+class AssetStore:
+    """Static files and the page template, loaded once and served from memory
+
+    Text files are precompressed (gzip, plus brotli when the `brotli` package
+    is installed) at startup. Every response carries a strong ETag, so
+    unchanged files revalidate with a bodiless 304. The page links assets as
+    /static/<name>?v=<content hash>, which are served with a year-long
+    immutable Cache-Control; any edit changes the hash and so the URL.
+    Media files are memory-mapped and serve byte ranges without copying the
+    whole file.
+    """
+
+    def __init__(self, static_dir=os.path.join(WEB_DIR, "static"),
+                 template=os.path.join(WEB_DIR, "templates", "index.html")):
+        self.assets = {}
+        self._maps = []
+        for root, _, files in os.walk(static_dir):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                self.assets[name] = self._load(name, path)
+
+        with open(template, "r", encoding="utf-8") as f:
+            html = f.read()
+        # Point the page at versioned URLs of everything it references
+        for name, asset in self.assets.items():
+            html = html.replace(f'"/static/{name}"', f'"/static/{name}?v={asset.version}"')
+        self.page = Asset("index.html", html.encode("utf-8"), "text/html; charset=utf-8")
+
+        total = sum(len(asset.body) for asset in self.assets.values())
+        logger.info(f"Loaded {len(self.assets)} static assets ({total / 1024:.0f} KB) and the page template, "
+                    f"precompressed with {'gzip and brotli' if brotli else 'gzip'}")
+
+    def _load(self, name, path):
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        with open(path, "rb") as f:
+            if content_type.startswith(COMPRESSIBLE_TYPES) or os.path.getsize(path) == 0:
+                return Asset(name, f.read(), content_type)
+            # Shared read-only mapping: forked workers reuse the same page cache pages
+            body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(body)
+        return Asset(name, body, content_type, mapped=True)
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    def serve(self, request, asset, versioned=False):
+        """Response for `asset`: 304 if the client's copy is current, a byte range if asked, else the full body"""
+        encoding = asset.negotiate(request.headers.get("accept-encoding", ""))
+        etag = asset.etag_for(encoding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+            if request.method == "HEAD":
+                return self._head(asset, headers, len(asset.encoded[encoding]))
+            return Response(asset.encoded[encoding], media_type=asset.content_type, headers=headers)
+
+        headers["Accept-Ranges"] = "bytes"
+        range_header = request.headers.get("range")
+        # A Range with a stale If-Range validator gets the full (new) file instead
+        if range_header and request.headers.get("if-range", etag) == etag:
+            return self._serve_range(asset, range_header, headers, request.method == "HEAD")
+        return self._send(asset, headers, head=request.method == "HEAD")
+
+    @staticmethod
+    def _head(asset, headers, length, status_code=200):
+        """Headers of the response a GET would get, without the body"""
+        headers["Content-Length"] = str(length)
+        return Response(status_code=status_code, media_type=asset.content_type, headers=headers)
+
+    def _send(self, asset, headers, start=0, end=None, status_code=200, head=False):
+        """Bytes start..end (inclusive) of the asset; memory-mapped ones are streamed in chunks"""
+        end = len(asset.body) - 1 if end is None else end
+        if head:
+            return self._head(asset, headers, end - start + 1, status_code)
+        if not asset.mapped:
+            body = asset.body if (start, end) == (0, len(asset.body) - 1) else asset.body[start:end + 1]
+            return Response(body, status_code=status_code, media_type=asset.content_type, headers=headers)
+
+        headers["Content-Length"] = str(end - start + 1)
+        view = memoryview(asset.body)
+
+        def chunks():
+            for offset in range(start, end + 1, RANGE_CHUNK_BYTES):
+                yield bytes(view[offset:min(offset + RANGE_CHUNK_BYTES, end + 1)])
+
+        return StreamingResponse(chunks(), status_code=status_code, media_type=asset.content_type, headers=headers)
+
+    def _serve_range(self, asset, range_header, headers, head=False):
+        size = len(asset.body)
+        match = _RANGE.match(range_header.strip())
+        if match is None or match.groups() == ("", ""):
+            # Multiple or malformed ranges: the whole file is a valid answer
+            return self._send(asset, headers, head=head)
+
+        first, last = match.groups()
+        if first == "":
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return self._send(asset, headers, start, end, status_code=206, head=head)
@@ -0,0 +1,152 @@
+import cv2
+import numpy as np
+import json
+import logging
+import os
+import sys
+import time
+
+# Shared detection helpers live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import select_backend
+from detection import load_thresholds, log_diagnostics
+
+logger = logging.getLogger(__name__)
+
+# Environment variable naming a config file to use instead of the repository's config.json
+CONFIG_PATH_ENV = "DOOMSCROLL_CONFIG"
+
+# cv2.imdecode flags for each supported decode reduction factor
+DECODE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+def load_config():
+    """Load the shared root config.json, or the file named by $DOOMSCROLL_CONFIG (empty dict if unavailable)"""
+    try:
+        config_path = os.environ.get(CONFIG_PATH_ENV)
+        if not config_path:
+            # Try both paths just in case
+            config_path = "../config.json" if os.path.exists("../config.json") else "config.json"
+        with open(config_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not load config: {e}")
+        return {}
+
+def load_roasts(config):
+    """Roasting messages from config, with a single fallback message"""
+    try:
+        return config['roasting']['messages']
+    except (KeyError, TypeError):
+        logger.warning("Could not load roasts, using fallback message")
+        return ["PUT. THE. PHONE. DOWN. NOW."]
+
+def decode_gray(image_bytes, reduce=1):
+    """Decode encoded image bytes straight to grayscale, optionally at 1/2, 1/4 or 1/8 size"""
+    if reduce not in DECODE_FLAGS:
+        raise ValueError(f"reduce must be one of {sorted(DECODE_FLAGS)}")
+    gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), DECODE_FLAGS[reduce])
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return gray
+
+def box_dict(box_type, box):
+    """(x, y, w, h) array row -> JSON-friendly box for DetectionResponse"""
+    x, y, w, h = (int(v) for v in box)
+    return {"type": box_type, "x": x, "y": y, "w": w, "h": h}
+
+def warmup_image():
+    """A JPEG with some texture, used to push a worker through its first detection at startup"""
+    y, x = np.mgrid[0:480, 0:640]
+    frame = ((x * 7 + y * 3) % 256).astype(np.uint8)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+class DetectionModels:
+    """Config and the selected detection backend, loaded once per server process
+
+    Build this before the server forks (module level in app.py, so
+    `gunicorn --preload` or a fork-started process pool inherits it) and
+    backend selection (including calibration, if enabled) runs once and the
+    dlib predictor is shared copy-on-write instead of loaded per worker.
+    Each detector takes its own copy of the backend, since Haar cascades
+    must not be shared between concurrent calls.
+    """
+
+    def __init__(self, config=None):
+        start = time.perf_counter()
+        self.config = load_config() if config is None else config
+        self.backend, self.calibration = select_backend(self.config)
+        self.use_dlib = self.backend.kind == "dlib"
+
+        self.load_seconds = time.perf_counter() - start
+        logger.info(f"Loaded {self.backend.label} models in {self.load_seconds * 1e3:.0f} ms")
+
+class DoomscrollDetectorAPI:
+    def __init__(self, config=None, models=None):
+        """Initialize detector for API use (no GUI), reusing preloaded models when given"""
+        if models is None:
+            models = DetectionModels(config)
+        config = models.config
+        # Face search runs on a frame shrunk by this factor; landmarks/eyes use full resolution
+        self.detection_scale = config.get('detection', {}).get('scale', 1.0)
+        self.thresholds = load_thresholds(config)
+
+        self.backend = models.backend.for_thread()
+        self.use_dlib = self.backend.kind == "dlib"
+
+    def detect_doomscroll(self, gray, reduce=1, tracker=None, timings=None, crop=None):
+        """Detect doomscrolling from a single grayscale frame
+
+        `reduce` is the factor the frame was downscaled by at decode time;
+        returned boxes are mapped back to full-resolution coordinates.
+        An optional FaceTracker restricts the face search to the last face,
+        and an optional `timings` dict collects per-stage seconds.
+        `crop` is (x, y, frame_height) when `gray` is only a region of the
+        client's frame; boxes and the face position score then refer to the
+        full frame, and the tracker is reset since the crop already is the ROI.
+        """
+        origin, frame_height = (0, 0), None
+        if crop is not None:
+            x, y, full_height = crop
+            origin, frame_height = (x // reduce, y // reduce), full_height / reduce
+            if tracker is not None:
+                tracker.reset()
+                tracker = None
+
+        if self.use_dlib:
+            is_doomscrolling, boxes = self._detect_dlib(gray, timings, origin)
+        else:
+            is_doomscrolling, boxes = self._detect_opencv(gray, tracker, timings, origin, frame_height)
+
+        if reduce != 1:
+            for box in boxes:
+                for key in ("x", "y", "w", "h"):
+                    box[key] *= reduce
+
+        return is_doomscrolling, boxes
+
+    def _detect_opencv(self, gray, tracker=None, timings=None, origin=(0, 0), frame_height=None):
+        """OpenCV-based detection with score-based smoothing"""
+        analysis = self.backend.analyze(gray, self.thresholds, self.detection_scale, tracker, timings,
+                                        origin, frame_height)
+        boxes = []
+
+        for face, eyes in zip(analysis["faces"], analysis["eyes"]):
+            boxes.append(box_dict("face", face))
+            if len(eyes) >= 2:
+                boxes.extend(box_dict("eye", eye) for eye in eyes)
+
+        log_diagnostics(self.backend.label, analysis)
+        return bool(analysis["looking_down"].any()), boxes
+
+    def _detect_dlib(self, gray, timings=None, origin=(0, 0)):
+        """dlib-based detection"""
+        analysis = self.backend.analyze(gray, self.thresholds, self.detection_scale, timings=timings, origin=origin)
+        boxes = [box_dict("face", face) for face in analysis["faces"]]
+        log_diagnostics(self.backend.label, analysis)
+        return bool(analysis["looking_down"].any()), boxes
@@ -0,0 +1,12 @@
+# Multi-worker deployment: cd web && gunicorn -c gunicorn.conf.py app:app
+#
+# preload_app imports app.py (config, roasts, detection models) once in the
+# master before forking, so workers share that memory copy-on-write. Each
+# worker then starts and warms up its own detection pool in the app lifespan.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 60
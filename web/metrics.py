@@ -0,0 +1,272 @@
+import bisect
+import threading
+
+# Seconds; covers a fast ROI-tracked frame up to a saturated pod
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FACE_COUNT_BUCKETS = (0, 1, 2, 3, 5)
+
+
+class _Shards:
+    """Per-thread value slots, only merged when scraped
+
+    Each recording thread gets its own preallocated list the first time it
+    records, so the hot path is an index increment with no lock and no
+    allocation. The lock is only taken to register a new thread or to scrape.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def mine(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0] * self._size
+            with self._lock:
+                self._all.append(values)
+            self._local.values = values
+            return values
+
+    def totals(self):
+        with self._lock:
+            shards = list(self._all)
+        return [sum(column) for column in zip(*shards)] if shards else [0] * self._size
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.mine()[0] += amount
+
+    def value(self):
+        return self._shards.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One slot per bucket, one for +Inf, then the running sum
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value):
+        values = self._shards.mine()
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    def snapshot(self):
+        totals = self._shards.totals()
+        return totals[:-1], totals[-1]
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one label combination; hold on to it to skip the lookup on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def expose(self):
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value())}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def expose(self):
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time (e.g. the pool's queue depth)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, read):
+        self._read = read
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def expose(self):
+        return self.header() + [f"{self.name} {_format_value(self._read())}"]
+
+
+class Info(_Metric):
+    """Constant 1 whose labels carry the information (e.g. which detection backend is in use)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, info):
+        self._info = dict(info)
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def expose(self):
+        return self.header() + [f"{self.name}{_format_labels(self._info.keys(), self._info.values())} 1"]
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text exposition format"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+class DetectionMetrics:
+    """The server's detection metrics: requests, per-stage latency, faces per frame, outcomes, pool load, backend"""
+
+    def __init__(self, pool, registry=None, models=None):
+        self.registry = registry or MetricsRegistry()
+        register = self.registry.register
+
+        self.requests = register(Counter(
+            "doomscroll_requests_total", "Detection requests by endpoint and status code",
+            ("endpoint", "status")))
+        self.request_seconds = register(Histogram(
+            "doomscroll_request_seconds", "Total time per detection request or streamed frame",
+            ("endpoint",)))
+        self.stage_seconds = register(Histogram(
+            "doomscroll_stage_seconds",
+            "Time per detection stage (base64, decode, motion, face, eyes, landmarks, scoring)",
+            ("stage",)))
+        self.faces = register(Histogram(
+            "doomscroll_faces_per_frame", "Faces found per analyzed frame", buckets=FACE_COUNT_BUCKETS))
+        self.frames = register(Counter(
+            "doomscroll_frames_total", "Analyzed frames by outcome", ("result",)))
+        self.motion_gate = register(Counter(
+            "doomscroll_motion_gate_total",
+            "Session frames by motion gate decision (reused = cascade skipped, previous result returned)",
+            ("decision",)))
+        register(Gauge(
+            "doomscroll_queue_depth", "Accepted frames waiting for a detection worker",
+            lambda: pool.queue_depth))
+        register(Gauge(
+            "doomscroll_in_flight", "Frames accepted by the detection pool and not yet finished",
+            lambda: pool.in_flight))
+
+        if models is not None:
+            register(Info(
+                "doomscroll_backend_info", "Detection backend in use and whether startup calibration picked it",
+                {"backend": models.backend.label, "kind": models.backend.kind,
+                 "calibrated": str(models.calibration is not None).lower()}))
+            if models.calibration:
+                p95 = next(result["p95_ms"] for result in models.calibration if result["selected"]) / 1e3
+                register(Gauge(
+                    "doomscroll_backend_calibrated_p95_seconds",
+                    "p95 full-search latency of the selected backend on the calibration clip", lambda: p95))
+
+        self._doomscrolling = self.frames.labels("doomscrolling")
+        self._normal = self.frames.labels("normal")
+        self._reused = self.motion_gate.labels("reused")
+        self._analyzed = self.motion_gate.labels("analyzed")
+
+    def observe_stages(self, timings):
+        for stage, seconds in timings.items():
+            self.stage_seconds.labels(stage).observe(seconds)
+
+    def observe_detection(self, is_doomscrolling, boxes, timings, reused=None):
+        """Record one frame; `reused` is None for frames without a motion gate (no session)"""
+        self.observe_stages(timings)
+        if reused is not None:
+            (self._reused if reused else self._analyzed).inc()
+        if reused:
+            return
+        self.faces.observe(sum(1 for box in boxes if box["type"] == "face"))
+        (self._doomscrolling if is_doomscrolling else self._normal).inc()
+
+    def observe_request(self, endpoint, status, seconds):
+        self.requests.labels(endpoint, str(status)).inc()
+        self.request_seconds.labels(endpoint).observe(seconds)
+
+    def expose(self):
+        return self.registry.expose()
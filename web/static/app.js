@@ -2,11 +2,19 @@ let video, overlayCanvas, overlayCtx, detectionCanvas, detectionCtx;
 let isMonitoring = false;
 let detectionCount = 0;
 let rickrollPlaying = false;
-let detectionInterval;
+let detectionTimer = null;
 let cooldownActive = false;
 let lastDetectionTime = 0;
 let consecutiveBadDetections = 0;
 const BAD_DETECTION_THRESHOLD = 1; // Immediate trigger for verification (was 2)
+const RETRY_DELAY_MS = 1500; // Next attempt after an error, unless the server says otherwise
+const COOLDOWN_SECONDS = 10;
+let detectionSocket = null;
+let awaitingResult = false; // One frame in flight at a time; its response schedules the next
+let sessionId = null; // Lets the server keep face tracking state between HTTP requests
+const UPLOAD_GRAYSCALE = true; // Detection only needs luminance; smaller JPEGs
+let cropHint = null; // Region the server asked for next (mirrored frame coordinates), null = full frame
+let streamCropKey = ''; // Crop last announced on the WebSocket
 
 const startBtn = document.getElementById('startBtn');
 const stopBtn = document.getElementById('stopBtn');
@@ -60,61 +68,243 @@ function updateStatus(title, desc, type, icon) {
     statusText.className = `value status-text ${type}`;
 }
 
-async function captureAndDetect() {
-    if (!isMonitoring || cooldownActive) {
-        overlayCtx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
-        return;
+// Region of the mirrored frame to upload: the server's crop hint clamped to the frame, or everything
+function uploadRegion() {
+    const frameWidth = overlayCanvas.width;
+    const frameHeight = overlayCanvas.height;
+    if (!cropHint) {
+        return { x: 0, y: 0, w: frameWidth, h: frameHeight, frameHeight, cropped: false };
+    }
+    const x = Math.max(0, Math.min(cropHint.x, frameWidth - 1));
+    const y = Math.max(0, Math.min(cropHint.y, frameHeight - 1));
+    const w = Math.min(cropHint.w, frameWidth - x);
+    const h = Math.min(cropHint.h, frameHeight - y);
+    return { x, y, w, h, frameHeight, cropped: true };
+}
+
+// Draw the mirrored upload region into the detection canvas; returns the region
+function captureFrame() {
+    const region = uploadRegion();
+    if (detectionCanvas.width !== region.w || detectionCanvas.height !== region.h) {
+        detectionCanvas.width = region.w;
+        detectionCanvas.height = region.h;
     }
 
-    // Capture frame
     detectionCtx.save();
+    if (UPLOAD_GRAYSCALE) {
+        detectionCtx.filter = 'grayscale(1)';
+    }
     detectionCtx.scale(-1, 1);
-    detectionCtx.drawImage(video, -detectionCanvas.width, 0, detectionCanvas.width, detectionCanvas.height);
+    // Mirrored columns [x, x + w) come from video columns [width - x - w, width - x)
+    detectionCtx.drawImage(video, overlayCanvas.width - region.x - region.w, region.y, region.w, region.h,
+                           -region.w, 0, region.w, region.h);
     detectionCtx.restore();
+    return region;
+}
+
+function cropQuery(region) {
+    return region.cropped ? `?crop_x=${region.x}&crop_y=${region.y}&frame_height=${region.frameHeight}` : '';
+}
+
+// Tell the stream which region the next binary frames hold, only when it changes
+function announceStreamCrop(region) {
+    const command = region.cropped
+        ? { type: 'crop', x: region.x, y: region.y, frame_height: region.frameHeight }
+        : { type: 'crop' };
+    const key = JSON.stringify(command);
+    if (key !== streamCropKey) {
+        detectionSocket.send(key);
+        streamCropKey = key;
+    }
+}
+
+// Send the next frame after `delayMs`, replacing any pending timer
+function scheduleDetection(delayMs) {
+    clearTimeout(detectionTimer);
+    detectionTimer = null;
+    if (isMonitoring) {
+        detectionTimer = setTimeout(runDetection, Math.max(0, delayMs));
+    }
+}
 
-    const imageData = detectionCanvas.toDataURL('image/jpeg', 0.8);
+function runDetection() {
+    detectionTimer = null;
+    if (detectionSocket) {
+        streamFrame();
+    } else {
+        captureAndDetect();
+    }
+}
+
+function retryAfterMs(response) {
+    const seconds = parseFloat(response.headers.get('Retry-After'));
+    return Number.isFinite(seconds) ? seconds * 1000 : RETRY_DELAY_MS;
+}
+
+async function captureAndDetect() {
+    // The end of a cooldown restarts the schedule
+    if (!isMonitoring || cooldownActive) {
+        overlayCtx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
+        return;
+    }
+    if (awaitingResult) {
+        return;
+    }
+
+    const region = captureFrame();
+    awaitingResult = true;
+    let nextDelay = RETRY_DELAY_MS;
 
     try {
-        const response = await fetch('/api/detect', {
+        // Upload raw JPEG bytes (no base64/JSON wrapping)
+        const frameBlob = await captureFrameBlob();
+        const response = await fetch(`/api/detect/frame${cropQuery(region)}`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ image: imageData })
+            headers: { 'Content-Type': 'image/jpeg', 'X-Session-Id': sessionId },
+            body: frameBlob
         });
 
+        if (!response.ok) {
+            if (response.status === 503) {
+                nextDelay = retryAfterMs(response);
+            }
+            console.error('Detection error:', response.status);
+            cropHint = null;
+            return;
+        }
+
         const result = await response.json();
         console.log('Detection response:', result);
+        handleDetectionResult(result);
+        nextDelay = result.next_capture_ms;
+    } catch (error) {
+        console.error('Detection error:', error);
+    } finally {
+        awaitingResult = false;
+        scheduleDetection(nextDelay);
+    }
+}
+
+async function streamFrame() {
+    if (!isMonitoring || cooldownActive) {
+        overlayCtx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
+        return;
+    }
+    if (awaitingResult || !detectionSocket || detectionSocket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+
+    const region = captureFrame();
+    awaitingResult = true;
+    try {
+        const frameBlob = await captureFrameBlob();
+        announceStreamCrop(region);
+        detectionSocket.send(frameBlob);
+    } catch (error) {
+        awaitingResult = false;
+        console.error('Stream error:', error);
+        scheduleDetection(RETRY_DELAY_MS);
+    }
+}
 
-        // Draw detection squares
-        drawDetectionBoxes(result.boxes, result.doomscrolling);
+function openDetectionSocket() {
+    const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+    // Same session id as the HTTP fallback, so /api/stats finds this session's history
+    const query = `threshold=${BAD_DETECTION_THRESHOLD}&session=${encodeURIComponent(sessionId)}`;
+    const socket = new WebSocket(`${protocol}://${location.host}/ws/detect?${query}`);
+
+    socket.onopen = () => {
+        scheduleDetection(0);
+    };
+    socket.onmessage = (event) => {
+        awaitingResult = false;
+        const result = JSON.parse(event.data);
+        if (result.error) {
+            console.error('Detection error:', result.error);
+            cropHint = null;
+            scheduleDetection(result.retry_after ? result.retry_after * 1000 : RETRY_DELAY_MS);
+            return;
+        }
+        if (!result.cooldown) {
+            handleDetectionResult(result);
+        }
+        scheduleDetection(result.next_capture_ms);
+    };
+    socket.onclose = () => {
+        awaitingResult = false;
+        streamCropKey = '';
+        if (detectionSocket === socket) {
+            detectionSocket = null;
+        }
+        // Fall back to HTTP requests if the stream drops mid-session
+        if (isMonitoring) {
+            scheduleDetection(0);
+        }
+    };
+    return socket;
+}
 
-        if (result.doomscrolling) {
-            consecutiveBadDetections++;
-            if (consecutiveBadDetections >= BAD_DETECTION_THRESHOLD) {
+function closeDetectionSocket() {
+    if (detectionSocket) {
+        const socket = detectionSocket;
+        detectionSocket = null;
+        socket.close();
+    }
+    awaitingResult = false;
+}
+
+function handleDetectionResult(result) {
+    // Boxes are in full-frame coordinates even when only a crop was uploaded
+    drawDetectionBoxes(result.boxes, result.doomscrolling);
+    // Null when no face was found (or a periodic full frame is due): upload the whole frame next
+    cropHint = result.crop || null;
+
+    // Streaming results carry the server-side streak; HTTP results are counted here
+    if (result.consecutive_bad !== undefined) {
+        consecutiveBadDetections = result.consecutive_bad;
+    } else if (result.doomscrolling) {
+        consecutiveBadDetections++;
+    } else {
+        consecutiveBadDetections = 0;
+    }
+
+    if (result.doomscrolling) {
+        if (consecutiveBadDetections >= BAD_DETECTION_THRESHOLD) {
+            // Count episodes rather than frames so the total doesn't depend on frame rate
+            if (!rickrollPlaying) {
                 detectionCount++;
                 detectionCountSpan.textContent = detectionCount;
                 detectionCountSpan.classList.add('pulse');
                 setTimeout(() => detectionCountSpan.classList.remove('pulse'), 500);
-
-                updateStatus('Doomscrolling', result.message, 'bad', '🚨');
-                playRickroll(result.message);
-            } else {
-                console.log(`Bad detection: ${consecutiveBadDetections}/${BAD_DETECTION_THRESHOLD}`);
-                updateStatus('Suspicious', `Detecting... (${consecutiveBadDetections}/${BAD_DETECTION_THRESHOLD})`, 'neutral', '🧐');
             }
+
+            updateStatus('Doomscrolling', result.message, 'bad', '🚨');
+            playRickroll(result.message);
         } else {
-            consecutiveBadDetections = 0;
-            updateStatus('Focused', result.message || 'Monitoring active...', 'good', '✅');
+            console.log(`Bad detection: ${consecutiveBadDetections}/${BAD_DETECTION_THRESHOLD}`);
+            updateStatus('Suspicious', `Detecting... (${consecutiveBadDetections}/${BAD_DETECTION_THRESHOLD})`, 'neutral', '🧐');
         }
-    } catch (error) {
-        console.error('Detection error:', error);
+    } else {
+        updateStatus('Focused', result.message || 'Monitoring active...', 'good', '✅');
     }
 }
 
+function captureFrameBlob() {
+    return new Promise((resolve, reject) => {
+        detectionCanvas.toBlob(blob => {
+            if (blob) {
+                resolve(blob);
+            } else {
+                reject(new Error('Frame encoding failed'));
+            }
+        }, 'image/jpeg', 0.8);
+    });
+}
+
 function resizeCanvases() {
+    // The detection canvas is sized per upload in captureFrame()
     overlayCanvas.width = video.videoWidth || 640;
     overlayCanvas.height = video.videoHeight || 480;
-    detectionCanvas.width = video.videoWidth || 640;
-    detectionCanvas.height = video.videoHeight || 480;
 }
 
 function drawDetectionBoxes(boxes, isBad) {
@@ -165,23 +355,45 @@ function stopRickroll() {
 function dismissRickroll() {
     stopRickroll();
     cooldownActive = true;
+    if (detectionSocket && detectionSocket.readyState === WebSocket.OPEN) {
+        detectionSocket.send(JSON.stringify({ type: 'cooldown', seconds: COOLDOWN_SECONDS }));
+    } else if (sessionId) {
+        fetch(`/api/cooldown?seconds=${COOLDOWN_SECONDS}`, {
+            method: 'POST',
+            headers: { 'X-Session-Id': sessionId }
+        }).catch(error => console.error('Cooldown error:', error));
+    }
     updateStatus('Cooldown', 'Focus session resumed', 'neutral', '⏳');
 
-    // 10 second cooldown
+    // 10 second cooldown, then pick the schedule back up
     setTimeout(() => {
         cooldownActive = false;
         if (isMonitoring) {
             updateStatus('Focused', 'Monitoring resumed', 'good', '✅');
+            scheduleDetection(0);
         }
-    }, 10000);
+    }, COOLDOWN_SECONDS * 1000);
+}
+
+function newSessionId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 }
 
 function startMonitoring() {
     isMonitoring = true;
+    sessionId = newSessionId();
+    cropHint = null;
     startBtn.disabled = true;
     stopBtn.disabled = false;
     updateStatus('Monitoring', 'Session in progress', 'good', '👁️');
-    detectionInterval = setInterval(captureAndDetect, 1500); // 1.5s interval
+    if ('WebSocket' in window) {
+        detectionSocket = openDetectionSocket();
+    } else {
+        scheduleDetection(0);
+    }
 }
 
 function stopMonitoring() {
@@ -191,10 +403,9 @@ function stopMonitoring() {
     overlayCtx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
     updateStatus('Standby', 'Monitoring stopped', 'neutral', '💤');
     stopRickroll();
-
-    if (detectionInterval) {
-        clearInterval(detectionInterval);
-    }
+    closeDetectionSocket();
+    clearTimeout(detectionTimer);
+    detectionTimer = null;
 }
 
 startBtn.addEventListener('click', startMonitoring);
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from detector import DetectionModels, DoomscrollDetectorAPI, decode_gray, warmup_image
+
+logger = logging.getLogger(__name__)
+
+# Each worker thread (or process) owns its own detector, since cascades are
+# not safe to share between concurrent calls
+_local = threading.local()
+
+# Set by DetectionPool.start(); forked process workers inherit it
+_models = None
+
+# How long a warmed-up worker waits for its siblings at startup
+WORKER_READY_TIMEOUT_SECONDS = 60
+
+def _init_worker(ready=None):
+    """Build this worker's detector and run one warm-up frame so the first real request doesn't pay for it
+
+    `ready` is a barrier shared by all of the pool's workers at startup, so
+    none of them takes a job until every one of them is warm.
+    """
+    global _models
+    if _models is None:
+        _models = DetectionModels()
+
+    start = time.perf_counter()
+    _local.detector = DoomscrollDetectorAPI(models=_models)
+    built = time.perf_counter()
+    _local.detector.detect_doomscroll(decode_gray(warmup_image()))
+    logger.info(f"Worker {os.getpid()}/{threading.current_thread().name} ready: "
+                f"detector {(built - start) * 1e3:.0f} ms, warm-up {(time.perf_counter() - built) * 1e3:.0f} ms")
+    if ready is not None:
+        try:
+            ready.wait(WORKER_READY_TIMEOUT_SECONDS)
+        except threading.BrokenBarrierError:
+            logger.warning("Timed out waiting for the other detection workers to warm up")
+
+def _worker_ready():
+    """No-op job; submitting one per worker forces every worker through _init_worker"""
+    return os.getpid()
+
+def detect_frame(image_bytes, reduce=1, tracker=None, gate=None, crop=None):
+    """Decode and analyze one frame using the calling worker's detector
+
+    If a MotionGate says the frame is unchanged, its stored result is
+    reused and the cascade is skipped. `crop` is (x, y, frame_height) when
+    the image is a region of the client's frame. The tracker, gate and per-stage
+    timings are returned alongside the result because process workers
+    operate on pickled copies and can't record metrics in the server process.
+    """
+    if getattr(_local, "detector", None) is None:
+        _init_worker()
+    start = time.perf_counter()
+    gray = decode_gray(image_bytes, reduce)
+    decoded = time.perf_counter()
+    timings = {"decode": decoded - start}
+
+    reused = gate.check(gray) if gate is not None else None
+    if gate is not None:
+        timings["motion"] = time.perf_counter() - decoded
+    if reused is not None:
+        is_doomscrolling, boxes = reused
+        return is_doomscrolling, boxes, tracker, gate, timings
+
+    is_doomscrolling, boxes = _local.detector.detect_doomscroll(gray, reduce, tracker, timings, crop)
+    if gate is not None:
+        gate.store((is_doomscrolling, boxes))
+    return is_doomscrolling, boxes, tracker, gate, timings
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__("Detection queue is full")
+        self.retry_after = retry_after
+
+
+class DetectionPool:
+    """Bounded executor that keeps CPU-bound detection off the event loop
+
+    `thread` pools suit OpenCV, which releases the GIL inside detectMultiScale;
+    `process` pools suit dlib. At most `workers + queue_size` frames are
+    accepted at once; anything beyond that fails fast with PoolSaturated.
+
+    The executor is only created by start(), which runs in the server's
+    startup phase, i.e. after any pre-fork preload, so no executor state
+    is inherited across a fork.
+    """
+
+    def __init__(self, kind="thread", workers=2, queue_size=8, retry_after_seconds=1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self.retry_after_seconds = retry_after_seconds
+        self.in_flight = 0
+        self._executor = None
+
+    @classmethod
+    def from_config(cls, config):
+        server = config.get('server', {})
+        return cls(
+            kind=server.get('executor', 'thread'),
+            workers=server.get('workers', 2),
+            queue_size=server.get('queue_size', 8),
+            retry_after_seconds=server.get('retry_after_seconds', 1)
+        )
+
+    async def start(self, models=None):
+        """Create the workers and wait until each one has built its detector and run a warm-up frame"""
+        global _models
+        if models is not None:
+            _models = models
+
+        start = time.perf_counter()
+        if self.kind == "thread":
+            ready = threading.Barrier(self.workers)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(ready,))
+        else:
+            context = multiprocessing.get_context()
+            ready = context.Barrier(self.workers)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=(ready,))
+        # One job per worker: each spawns a worker, and none can finish before all are warm
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _worker_ready) for _ in range(self.workers)))
+        logger.info(f"Detection pool: {self.workers} {self.kind} workers, capacity {self.capacity}, "
+                    f"ready in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+    @property
+    def queue_depth(self):
+        """Accepted frames still waiting for a free worker"""
+        return max(0, self.in_flight - self.workers)
+
+    def _release(self):
+        self.in_flight -= 1
+
+    async def detect(self, image_bytes, reduce=1, tracker=None, gate=None, crop=None):
+        """Run detect_frame on a worker; raises PoolSaturated instead of queueing unboundedly"""
+        if self._executor is None:
+            raise RuntimeError("Detection pool has not been started")
+        if self.in_flight >= self.capacity:
+            raise PoolSaturated(self.retry_after_seconds)
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            future = self._executor.submit(detect_frame, image_bytes, reduce, tracker, gate, crop)
+        except Exception:
+            self.in_flight -= 1
+            raise
+        # Release the slot when the worker finishes, even if the caller has gone away
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)